@@ -0,0 +1,135 @@
+# Delta messages between agents. Each message carries a sequence number
+# and only what the sender learned since its previous message; every
+# RESYNC_EVERY messages, and whenever the receiver asks, the sender sends
+# its full knowledge instead.
+#
+# Message fields, full or delta:
+#   seq              sequence number, from 1
+#   full             True if the sets below hold everything the sender knows
+#   resync           True if the sender missed a message and wants a full one
+#   frontier, visited, new_goals, collected_goals   sets of (row, col)
+#   teleports        teleport flag -> (row, col)
+#   exit_position    (row, col) or None
+
+RESYNC_EVERY = 100
+
+
+class LoggedSet(set):
+    """A set that also keeps what was added to it since take_added()."""
+
+    __slots__ = ['added']
+
+    def __init__(self, items=()):
+        super().__init__(items)
+        self.added = set(self)
+
+    def add(self, item):
+        if item not in self:
+            super().add(item)
+            self.added.add(item)
+
+    def update(self, *others):
+        for items in others:
+            new = set(items)
+            new -= self
+            super().update(new)
+            self.added |= new
+
+    def take_added(self):
+        added = self.added
+        self.added = set()
+        return added
+
+    def __reduce__(self):
+        return (self.__class__, (list(self),), (None, {'added': self.added}))
+
+
+class LoggedDict(dict):
+    """A dict that also keeps the entries set since take_added()."""
+
+    __slots__ = ['added']
+
+    def __init__(self, items=()):
+        super().__init__(items)
+        self.added = dict(self)
+
+    def __setitem__(self, key, value):
+        if self.get(key, self) != value:
+            self.added[key] = value
+        super().__setitem__(key, value)
+
+    def update(self, *others):
+        for items in others:
+            for key, value in dict(items).items():
+                self[key] = value
+
+    def take_added(self):
+        added = self.added
+        self.added = {}
+        return added
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),), (None, {'added': self.added}))
+
+
+class Channel:
+    """
+    One agent's end of the message stream: numbers outgoing messages,
+    drops duplicates and notices gaps in incoming ones. The agent keeps
+    its knowledge in LoggedSets (frontier, visited, seen_goals,
+    collected_goals) and a LoggedDict (teleports), so a delta is whatever
+    those logged since the last message.
+    """
+
+    def __init__(self):
+        self.seq = 0
+        self.received = 0
+        self.send_full = True
+        self.want_resync = False
+        self.resync_every = RESYNC_EVERY
+
+    def receive(self, msg):
+        # The message if it is new, None if there is none or it is a duplicate
+        if not msg:
+            return None
+        seq = msg.get('seq')
+        if seq is None:
+            # Full knowledge from an agent that does not number its messages
+            return msg
+        if seq <= self.received:
+            return None
+        if msg['full']:
+            self.want_resync = False
+        elif seq != self.received + 1:
+            self.want_resync = True
+        if msg['resync']:
+            self.send_full = True
+        self.received = seq
+        return msg
+
+    def create(self, ai):
+        self.seq += 1
+        full = self.send_full or self.seq % self.resync_every == 0
+        frontier = ai.frontier.take_added()
+        visited = ai.visited.take_added()
+        teleports = ai.teleports.take_added()
+        seen_goals = ai.seen_goals.take_added()
+        collected_goals = ai.collected_goals.take_added()
+        if full:
+            frontier = ai.frontier
+            visited = ai.visited
+            teleports = ai.teleports
+            seen_goals = ai.seen_goals
+            collected_goals = ai.collected_goals
+        self.send_full = False
+        return {
+            'seq': self.seq,
+            'full': full,
+            'resync': self.want_resync,
+            'frontier': frontier - ai.visited,
+            'visited': visited,
+            'exit_position': ai.exit_position,
+            'teleports': teleports,
+            'new_goals': seen_goals - ai.collected_goals,
+            'collected_goals': collected_goals,
+        }
@@ -0,0 +1,259 @@
+import queue
+import random
+import threading
+import multiprocessing
+import time
+
+# What to do when an agent's update overruns its per-turn budget
+BUDGET_POLICIES = [
+    'bad',     # The agent fails, as for an invalid command
+    'repeat',  # The agent repeats its last command
+]
+
+
+class ThreadRunner:
+    """
+    Runs one AI object's update calls on its own daemon thread, one call at
+    a time. A call that never returns only blocks that thread.
+    """
+
+    def __init__(self, ai):
+        self.ai = ai
+        self.requests = queue.Queue()
+        self.done = threading.Event()
+        self.busy = False
+        self.outcome = None
+        self.elapsed = 0.0
+        self.thread = threading.Thread(target=self.work, daemon=True)
+        self.thread.start()
+
+    def work(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            percepts, msg = request
+            start = time.perf_counter()
+            try:
+                outcome = ('OK', self.ai.update(percepts, msg))
+            except Exception as e:
+                outcome = ('ERROR', e)
+            self.elapsed = time.perf_counter() - start
+            self.outcome = outcome
+            self.done.set()
+
+    def submit(self, percepts, msg):
+        self.done.clear()
+        self.busy = True
+        self.requests.put((percepts, msg))
+
+    def finished(self):
+        return self.done.is_set()
+
+    def wait(self, timeout):
+        return self.done.wait(timeout)
+
+    def take(self):
+        self.busy = False
+        return self.outcome, self.elapsed
+
+    def close(self):
+        # A thread still stuck in update is left behind; it is a daemon
+        if not self.busy:
+            self.requests.put(None)
+
+
+def process_work(ai, conn, random_state):
+    # The random module reseeds itself in a forked child
+    random.setstate(random_state)
+    while True:
+        request = conn.recv()
+        if request is None:
+            return
+        percepts, msg = request
+        start = time.perf_counter()
+        try:
+            outcome = ('OK', ai.update(percepts, msg))
+        except Exception as e:
+            outcome = ('ERROR', repr(e))
+        conn.send((outcome, time.perf_counter() - start))
+
+
+class ProcessRunner:
+    """
+    Like ThreadRunner, but the AI object lives in a child process of its
+    own, so agents can decide in parallel and a stuck update can be killed.
+    The simulator's copy of the AI object is not updated, and each child
+    draws from its own copy of the random module's state.
+    """
+
+    def __init__(self, ai):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=process_work, args=(ai, child_conn, random.getstate()), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.busy = False
+
+    def submit(self, percepts, msg):
+        self.busy = True
+        self.conn.send((percepts, msg))
+
+    def finished(self):
+        return self.conn.poll()
+
+    def wait(self, timeout):
+        return self.conn.poll(timeout)
+
+    def take(self):
+        self.busy = False
+        return self.conn.recv()
+
+    def close(self):
+        if self.busy:
+            self.process.terminate()
+        else:
+            self.conn.send(None)
+        self.process.join()
+        self.conn.close()
+
+
+class TimeBudget:
+    """
+    Per-turn and total time limits for the agents' update calls. Each
+    agent's calls run on a ThreadRunner (a ProcessRunner with processes),
+    so run_sim can stop waiting for an agent that takes too long. With no
+    limits it only takes the calls off the simulator's thread.
+
+    start() hands an agent its percepts and finish() collects the answer,
+    so several agents can be deciding at once. finish() returns (cmd, msg,
+    status), where status is 'OK', 'OVERRUN' (the per-turn budget ran out;
+    cmd is the repeated command, or None with the 'bad' policy),
+    'OUT_OF_TIME' (the total budget ran out) or 'ERROR' (update raised).
+    cmd is None whenever the agent should fail. A call that is still
+    running counts against the total budget too, so an agent stuck in one
+    call runs out of time even with the 'repeat' policy.
+    """
+
+    def __init__(self, per_turn=None, total=None, policy='bad', processes=False):
+        if policy not in BUDGET_POLICIES:
+            raise ValueError(f"Unknown budget policy {policy}. Choose from: {', '.join(BUDGET_POLICIES)}")
+        self.per_turn = per_turn
+        self.total = total
+        self.policy = policy
+        self.processes = processes
+        self.runners = {}
+        self.used = {}
+        self.overruns = {}
+        # Per agent: None while its call is running, or the status it failed with
+        self.verdicts = {}
+        self.deadlines = {}
+        # Per agent: when its running call was submitted, how many turns it
+        # has held and how much of it is in used
+        self.submitted = {}
+        self.held = {}
+        self.charged = {}
+
+    def timeout(self, index):
+        limits = []
+        if self.per_turn is not None:
+            limits.append(self.per_turn)
+        if self.total is not None:
+            limits.append(max(0.0, self.total - self.used[index]))
+        return min(limits) if limits else None
+
+    def runner(self, agent):
+        index = agent.index
+        if index not in self.runners:
+            runner_class = ProcessRunner if self.processes else ThreadRunner
+            self.runners[index] = runner_class(agent.ai)
+            self.used[index] = 0.0
+            self.overruns[index] = 0
+        return self.runners[index]
+
+    def charge_running(self, index):
+        # Charges a call that has not answered for the time since it was
+        # submitted, and at least a turn's budget for every turn it held, so
+        # a stuck agent still uses up its total budget
+        spent = time.perf_counter() - self.submitted[index]
+        if self.per_turn is not None:
+            spent = max(spent, self.per_turn * self.held[index])
+        self.used[index] += spent - self.charged[index]
+        self.charged[index] = spent
+
+    def collect(self, agent):
+        # Takes the answer of the running call and charges what is left of it
+        answer, elapsed = self.runners[agent.index].take()
+        self.used[agent.index] += max(0.0, elapsed - self.charged[agent.index])
+        agent.times.append(elapsed)
+        return answer
+
+    def start(self, agent, percepts, msg):
+        index = agent.index
+        runner = self.runner(agent)
+
+        if runner.busy:
+            if not runner.finished():
+                # Still deciding an earlier turn
+                self.held[index] += 1
+                self.charge_running(index)
+                if self.total is not None and self.used[index] >= self.total:
+                    self.verdicts[index] = 'OUT_OF_TIME'
+                else:
+                    self.verdicts[index] = 'OVERRUN'
+                return
+            # A late answer for an earlier turn is stale
+            self.collect(agent)
+
+        if self.total is not None and self.used[index] >= self.total:
+            self.verdicts[index] = 'OUT_OF_TIME'
+            return
+
+        timeout = self.timeout(index)
+        if timeout is None:
+            self.deadlines[index] = (None, None)
+        else:
+            # Whether missing the deadline uses up the total budget
+            final = self.total is not None and self.used[index] + timeout >= self.total
+            self.deadlines[index] = (time.perf_counter() + timeout, final)
+        self.verdicts[index] = None
+        self.submitted[index] = time.perf_counter()
+        self.held[index] = 1
+        self.charged[index] = 0.0
+        runner.submit(percepts, msg)
+
+    def finish(self, agent):
+        index = agent.index
+        runner = self.runners[index]
+        verdict = self.verdicts.pop(index)
+        if verdict == 'OVERRUN':
+            return self.overrun(agent)
+        if verdict == 'OUT_OF_TIME':
+            return None, agent.msg, 'OUT_OF_TIME'
+
+        deadline, final = self.deadlines[index]
+        timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+        if not runner.wait(timeout):
+            self.charge_running(index)
+            if final:
+                return None, agent.msg, 'OUT_OF_TIME'
+            return self.overrun(agent)
+
+        status, value = self.collect(agent)
+        if status == 'ERROR':
+            return None, agent.msg, 'ERROR'
+        cmd, msg = value
+        return cmd, msg, 'OK'
+
+    def decide(self, agent, percepts, msg):
+        self.start(agent, percepts, msg)
+        return self.finish(agent)
+
+    def overrun(self, agent):
+        self.overruns[agent.index] += 1
+        if self.policy == 'repeat' and agent.cmd in ['N', 'E', 'S', 'W', 'U']:
+            return agent.cmd, agent.msg, 'OVERRUN'
+        return None, agent.msg, 'OVERRUN'
+
+    def close(self):
+        for runner in self.runners.values():
+            runner.close()
@@ -33,28 +33,38 @@
 # we tried to overfit it to some maps as was mentioned in class.
 
 import random
-import heapq
+import agentmsg
+import knownmap
+import dstar
+import pathcache
 
 class AI:
     def __init__(self, max_turns):
 
-        self.visited = set() # Tracks visited cells
-        self.frontier = set() # Frontier of seen but not yet explored cells
+        self.visited = agentmsg.LoggedSet() # Tracks visited cells
+        self.frontier = agentmsg.LoggedSet() # Frontier of seen but not yet explored cells
         self.position = (0,0) # Initializes starting position
         self.goal_found = 0
         self.turn = -1
         self.max_turns = max_turns
         self.exit_found = False
         self.exit_position = None
-        self.teleports = {}
+        self.teleports = agentmsg.LoggedDict()
         self.last_teleport_used = None  # Tracks the last teleport used to avoid looping
         self.last_teleport_timer = 0  # Tracks the turns since the last teleport use
         self.teleport_cooldown = 3  # Number of turns before allowing reuse of the last teleport
         # Teleport pairs to prevent back-and-forth loops
         self.teleport_pairs = {'o': 'b', 'b': 'o', 'y': 'p', 'p': 'y'}
-        self.seen_goals = set() # Tracks all seen goals, a set because we don't want duplicates
-        self.collected_goals = set()
+        self.seen_goals = agentmsg.LoggedSet() # Tracks all seen goals, a set because we don't want duplicates
+        self.collected_goals = agentmsg.LoggedSet()
         self.recent_moves = []  # Store recent moves to avoid jittering
+        self.channel = agentmsg.Channel()  # Numbers messages and sends only what changed
+        self.known = knownmap.KnownMap()  # Wall, free or unknown for every cell seen so far
+        # Searches kept between turns, one toward the frontier and one toward the exit
+        self.frontier_planner = dstar.DStarLite(self.known)
+        self.exit_planner = dstar.DStarLite(self.known)
+        self.path_cache = pathcache.PathCache(self.known)  # The path being followed, replanned only when invalidated
+        self.message_cells = set()  # Cells from messages that may be both frontier and visited
 
     def update(self, percepts, msg):
         """
@@ -89,6 +99,8 @@ class AI:
             case '0' | '1' | 'r' | 'b':
                 return 'U', {'frontier': self.frontier, 'visited': self.visited}
         """
+        msg = self.channel.receive(msg)  # None for a message already seen
+        goals_known, exit_known = len(self.seen_goals), self.exit_position
         if msg:
             if msg.get('exit_position') and not self.exit_found:
                 self.exit_position = msg['exit_position']
@@ -96,8 +108,17 @@ class AI:
             self.teleports.update(msg.get('teleports', {}))
             self.frontier.update(set(msg.get('frontier', [])))
             self.visited.update(set(msg.get('visited', [])))
+            self.message_cells.update(msg.get('frontier', []), msg.get('visited', []))
             self.seen_goals.update(set(msg.get('new_goals', [])))
             self.collected_goals.update(set(msg.get('collected_goals', [])))
+            # Cells the other agent found free can be planned through
+            self.known.mark_free(msg.get('frontier', []))
+            self.known.mark_free(msg.get('visited', []))
+            if self.exit_position:
+                self.known.mark_free([self.exit_position])
+            if len(self.seen_goals) != goals_known or self.exit_position != exit_known:
+                self.path_cache.invalidate('message')
+                goals_known, exit_known = len(self.seen_goals), self.exit_position
 
         print(f"A received the message: {msg}")
 
@@ -106,7 +127,11 @@ class AI:
         self.frontier.discard(current_cell)  # Removes from frontier once visited
 
         cell_type = percepts['X'][0]
-        self.detect_important_cells(percepts)
+        # Everything along the four rays goes into the map in one pass
+        marks = self.known.ingest(current_cell, percepts)
+        self.detect_important_cells(marks)
+        if len(self.seen_goals) != goals_known or self.exit_position != exit_known:
+            self.path_cache.invalidate('spotted')
 
         # Collects goal if on a goal cell
         if cell_type.isdigit() and current_cell not in self.collected_goals:
@@ -128,10 +153,11 @@ class AI:
         # Uses teleport if beneficial for repositioning and avoids repeated usage
         if cell_type in ('b', 'y', 'o', 'p') and self.should_use_teleport(turns_left, cell_type):
             self.last_teleport_used = cell_type
+            self.path_cache.invalidate('teleport')
             self.last_teleport_timer = 0
             return 'U', self.create_message()
 
-        self.update_frontier(percepts)
+        self.update_frontier()
 
         # Determines the next move
         if should_go_to_exit and self.exit_found:
@@ -158,56 +184,46 @@ class AI:
         return next_move, self.create_message()
 
     def create_message(self):
-        return {
-            'frontier': self.frontier - self.visited,
-            'visited': self.visited,
-            'exit_position': self.exit_position,
-            'teleports': self.teleports,
-            'new_goals': self.seen_goals - self.collected_goals, # Shares goals it saw but didnt collect yet
-            'collected_goals': self.collected_goals,  # Share total goals estimate
-        }
-
-
-
-    def update_frontier(self, percepts):
-        # Direction changes as changes in row and column indices
-        directions = {'N': (-1, 0), 'S': (1, 0), 'E': (0, 1), 'W': (0, -1)}
-
-        for key, direction in directions.items():
-            # Calculates the row and column of the adjacent cell in each direction
-            row = self.position[0] + direction[0]
-            col = self.position[1] + direction[1]
-
-            # Checks if the cell is not a wall and hasn't been visited
-            if percepts[key][0] != 'w' and (row, col) not in self.visited:
-                # If the cell is not already in the frontier, adds it to the list
-                if (row, col) not in self.frontier:
-                    self.frontier.add((row, col))
-
-    def detect_important_cells(self, percepts):
-        # Detects goals, teleports, and exit in percepts
-        for direction, data in percepts.items():
-            new_position = self.get_new_position(direction)
-            if data[0] == 'r':  # Found exit
+        # Only what changed since the last message, with a full resync now and then
+        return self.channel.create(self)
+
+
+
+    def update_frontier(self):
+        # The frontier is the free cells next to the agent that no agent has
+        # stood on, and the goals seen but not yet collected. Rays only fill in
+        # the map: seeing a cell does not make it explored, standing on it does.
+        for cell in knownmap.neighbors(self.position):
+            if cell not in self.visited and self.known.is_free(cell):
+                self.frontier.add(cell)
+        for goal in self.seen_goals.difference(self.collected_goals, self.visited):
+            self.frontier.add(goal)
+
+    def detect_important_cells(self, marks):
+        # Detects goals, teleports, and exit anywhere along the rays
+        for new_position, flag in marks:
+            if flag == 'r':  # Found exit
                 self.exit_found = True
                 self.exit_position = new_position
-            elif data[0] in ('b', 'y', 'o', 'p'):  # Found teleport
-                self.teleports[data[0]] = new_position
-            elif data[0].isdigit() and new_position not in self.seen_goals:  # Found a goal
+            elif flag in ('b', 'y', 'o', 'p'):  # Found teleport
+                self.teleports[flag] = new_position
+            elif flag.isdigit() and new_position not in self.seen_goals:  # Found a goal
                 self.seen_goals.add(new_position)
 
     def find_next_move(self, percepts):
 
-        # Removes any already-visited cells from the frontier
-        self.frontier -= self.visited
+        # Removes any already-visited cells from the frontier; only messages
+        # can put a cell in both, so only their cells are looked at
+        self.frontier.difference_update(self.message_cells & self.visited)
+        self.message_cells.clear()
 
         if self.frontier:
-            # Select the nearest frontier cell using A* search
-            direction = self.a_star_search(self.position, self.frontier)
+            # Select the nearest frontier cell, repairing last turn's search
+            direction = self.plan(self.frontier_planner, self.frontier)
             if direction:
                 return direction
 
-        # Default random move if A* fails
+        # Default random move if no path is found
         valid_moves = [d for d in ['N', 'S', 'E', 'W'] if percepts[d][0] != 'w']
         return random.choice(valid_moves) if valid_moves else 'N'
 
@@ -221,66 +237,14 @@ class AI:
 
     def move_toward(self, percepts, turns_left):
         if self.exit_found and turns_left < self.max_turns * 0.2:
-            return self.a_star_search(self.position, [self.exit_position])
+            return self.plan(self.exit_planner, [self.exit_position])
         elif self.frontier:
             return self.find_next_move(percepts)
         return None
 
-    def a_star_search(self, start, frontier):
-
-        # Priority queue that keeps track of cells to explore, ordered by their priority 
-        open_set = []
-        heapq.heappush(open_set, (0, start))
-        # Dictionary that maps each cell to the cell from which it was reached
-        previous_location = {start: None}
-        # Dictionary that stores the total cost to reach each cell from the starting cell
-        cost_so_far = {start: 0}
-
-        # While there are nodes to explore
-        while open_set:
-
-            # Removes the cell with the lowest priority from queue, setting it as the current cell
-            _, current = heapq.heappop(open_set)
-
-            # If we reach a frontier cell
-            if current in frontier:
-                return self.reconstruct_path(previous_location, current)
-
-            # Iterates over each of the four neighboring cells 
-            for dx, dy in [(-1, 0), (1, 0), (0, 1), (0, -1)]:
-                next_cell = (current[0] + dx, current[1] + dy)
-                # Every move just costs 1, so new_cost is the cost to reach current cell plus 1
-                new_cost = cost_so_far[current] + 1
-
-                # Checks if next cell hasn't been reached before or if the new path has a lower cost
-                if next_cell not in cost_so_far or new_cost < cost_so_far[next_cell]:
-                    # Updates the cost and priority and adds the new cell to the priority queue
-                    cost_so_far[next_cell] = new_cost
-                    priority = new_cost + self.manhattan_distance(next_cell, frontier)
-                    heapq.heappush(open_set, (priority, next_cell))
-                    previous_location[next_cell] = current
-
-        return None  # No path was found
-    
-    # Backtracks to find the first step that the agent should take toward the target (frontier) cell
-    def reconstruct_path(self, previous_location, current):
-
-        # List that stores the cells in reverse order as the method backtracks from the current cell to the start
-        path = []
-        # Traces each cell’s previous location link
-        while current in previous_location and previous_location[current] is not None:
-            path.append(current)
-            current = previous_location[current]
-
-        # Returns the direction of the next step
-        if path:
-            next_step = path[-1]
-            if next_step[0] < self.position[0]: return 'N'
-            if next_step[0] > self.position[0]: return 'S'
-            if next_step[1] < self.position[1]: return 'W'
-            if next_step[1] > self.position[1]: return 'E'
-
-        return 'N'  # Default direction if no path
+    def plan(self, planner, targets):
+        # Next step along the committed path, planning a new one from the planner's repaired search when needed
+        return self.path_cache.next_move(planner, self.position, targets)
 
     def manhattan_distance(self, cell, target_positions):
         # Calculates the number of steps needed to reach one cell from another
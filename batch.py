@@ -0,0 +1,163 @@
+import sys
+import os
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+import world
+import misc
+import agentrunner
+import sim
+import simlog
+
+# Worlds loaded by this process, by file name. Episodes run on forks.
+loaded_worlds = {}
+
+
+def get_world(world_filename):
+    if world_filename not in loaded_worlds:
+        the_world = world.make_world(world_filename, compact=True)
+        the_world.load_world()
+        if not the_world.cells:
+            raise misc.InvalidWorldException(f"World {world_filename} could not be loaded.")
+        loaded_worlds[world_filename] = the_world
+    return loaded_worlds[world_filename].fork()
+
+
+def run_episode(episode):
+    world_filename, seed, max_turns, budget = episode
+    the_world = get_world(world_filename)
+    if budget is not None:
+        # Processes, so an update that overruns is killed rather than left
+        # spinning in this worker for the episodes after it
+        budget = agentrunner.TimeBudget(*budget, processes=True)
+
+    # The agents use the global random module, so every episode is seeded
+    # on its own and gives the same result in any worker.
+    log = simlog.SimLog(level=simlog.OFF)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        result = sim.run_sim(the_world, max_turns, log, budget=budget, seed=seed)
+
+    return {
+        'world': world_filename,
+        'seed': seed,
+        'turns': result['turns'],
+        'scoreA': result['scores'][0],
+        'scoreB': result['scores'][1],
+        'total': result['total'],
+        'stateA': result['states'][0],
+        'stateB': result['states'][1],
+        'overrunsA': result['overruns'][0],
+        'overrunsB': result['overruns'][1],
+    }
+
+
+def run_batch(world_filenames, seeds, max_turns, workers=None, budget=None):
+    """
+    Runs one episode of sim.run_sim per (world, seed) and returns one row
+    per episode, ordered by world then seed. workers=1 runs everything in
+    this process; otherwise episodes are spread over a process pool.
+    budget is None or the (per_turn, total, policy) arguments of an
+    agentrunner.TimeBudget, made afresh for each episode. Its agents run on
+    processes, so an overrunning update is killed at the end of its episode.
+    """
+    episodes = [(w, seed, max_turns, budget) for w in world_filenames for seed in seeds]
+    if workers == 1:
+        return [run_episode(episode) for episode in episodes]
+
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(episodes) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run_episode, episodes, chunksize=chunksize))
+
+
+COLUMNS = ['world', 'seed', 'turns', 'scoreA', 'scoreB', 'total', 'stateA', 'stateB', 'overrunsA', 'overrunsB']
+
+
+def print_table(rows):
+    widths = {c: max([len(c)] + [len(str(row[c])) for row in rows]) for c in COLUMNS}
+    print("  ".join(c.ljust(widths[c]) for c in COLUMNS))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in COLUMNS))
+
+
+def write_csv(rows, filename):
+    with open(filename, 'w') as f:
+        f.write(",".join(COLUMNS) + "\n")
+        for row in rows:
+            f.write(",".join(str(row[c]) for c in COLUMNS) + "\n")
+
+
+def main():
+
+    world_filenames = []
+    first_seed = 0
+    last_seed = 1
+    max_turns = None
+    workers = None
+    output_filename = None
+    per_turn = None
+    total = None
+    policy = 'bad'
+
+    args = sys.argv
+
+    if "-h" in args or len(args) == 1:
+        print("Run every world for a range of seeds on a process pool.")
+        print("Usage: python batch.py -w <world> [-w <world> ...] -t <max turns>")
+        print("       [-s <first seed> <last seed>] [-j <workers>] [-o <csv file>]")
+        print("       [-b <seconds per turn>] [-bt <total seconds>] [-bp <bad|repeat>]")
+        print("With a budget each agent runs on a process of its own, killed at the end of the episode if still running.")
+        return
+
+    i = 1
+    while i < len(args):
+        try:
+            if args[i] == "-w":
+                world_filenames.append(args[i+1])
+            elif args[i] == "-s":
+                first_seed = int(args[i+1])
+                last_seed = int(args[i+2])
+            elif args[i] == "-t":
+                max_turns = int(args[i+1])
+            elif args[i] == "-j":
+                workers = int(args[i+1])
+            elif args[i] == "-o":
+                output_filename = args[i+1]
+            elif args[i] == "-b":
+                per_turn = float(args[i+1])
+            elif args[i] == "-bt":
+                total = float(args[i+1])
+            elif args[i] == "-bp":
+                if args[i+1] not in agentrunner.BUDGET_POLICIES:
+                    print(f"budget policy must be one of: {', '.join(agentrunner.BUDGET_POLICIES)}")
+                    return
+                policy = args[i+1]
+        except (IndexError, ValueError):
+            print("Incorrect command line arguments. Run with -h for help.")
+            return
+
+        i+=1
+
+    if not world_filenames or max_turns is None:
+        print("At least one -w and -t are required. Run with -h for help.")
+        return
+
+    budget = None
+    if per_turn is not None or total is not None:
+        budget = (per_turn, total, policy)
+
+    try:
+        rows = run_batch(world_filenames, range(first_seed, last_seed + 1), max_turns, workers, budget)
+    except (misc.InvalidCellException, misc.InvalidWorldException) as e:
+        print(e)
+        return
+
+    if output_filename is not None:
+        write_csv(rows, output_filename)
+    else:
+        print_table(rows)
+
+
+
+if __name__ == "__main__":
+    main()
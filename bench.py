@@ -0,0 +1,1096 @@
+import sys
+import time
+import random
+import heapq
+import os
+import tempfile
+import tracemalloc
+import contextlib
+import types
+import json
+import copy
+import platform
+
+import world
+import sim
+import generator
+import simlog
+import simtrace
+import aiA
+import aiB
+import agentrunner
+import timing
+import agentmsg
+import knownmap
+import dstar
+import pathcache
+
+
+def write_random_world(filename, width, height, wall_density=0.3, seed=0, binary=False):
+    the_world = generator.generate_world(
+        width, height, seed, 'random', wall_density, goals=3, teleport_pairs=2, exit_placement='random'
+    )
+    generator.save_world(the_world, filename, binary)
+
+
+def best_time(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def load(world_class, filename):
+    the_world = world_class(filename)
+    the_world.load_world()
+    return the_world
+
+
+def bench_grid_storage(size=1000):
+    # Compares the list-of-lists World with the flat CompactWorld.
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "world")
+        write_random_world(filename, size, size)
+
+        rng = random.Random(1)
+        points = [
+            (rng.randrange(1, size - 1), rng.randrange(1, size - 1))
+            for _ in range(20000)
+        ]
+
+        print(f"grid storage, {size}x{size} map")
+        print(f"{'backend':<14}{'load s':>10}{'memory MB':>12}{'get_cell s':>12}{'enterable s':>13}{'raycast s':>11}")
+        for world_class in [world.World, world.CompactWorld]:
+            tracemalloc.start()
+            the_world = load(world_class, filename)
+            memory = tracemalloc.get_traced_memory()[0] / 2**20
+            tracemalloc.stop()
+
+            load_time = best_time(lambda: load(world_class, filename), 1)
+
+            def get_cells():
+                for x, y in points:
+                    the_world.get_cell(x, y)
+
+            def enterable():
+                for x, y in points:
+                    the_world.is_cell_enterable(x, y)
+
+            def raycasts():
+                for x, y in points[:2000]:
+                    for dx, dy in [(0, -1), (1, 0), (0, 1), (-1, 0)]:
+                        the_world.prune_raycast(the_world.raycast(x, y, dx, dy))
+
+            print(
+                f"{world_class.__name__:<14}"
+                f"{load_time:>10.3f}"
+                f"{memory:>12.1f}"
+                f"{best_time(get_cells):>12.4f}"
+                f"{best_time(enterable):>13.4f}"
+                f"{best_time(raycasts):>11.4f}"
+            )
+
+
+def bench_percepts(size=1000):
+    # sim.get_percepts with full raycasts (World) against the wall-distance
+    # tables of CompactWorld.
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "world")
+        write_random_world(filename, size, size, wall_density=0.05)
+
+        rng = random.Random(2)
+        points = [
+            (rng.randrange(1, size - 1), rng.randrange(1, size - 1))
+            for _ in range(5000)
+        ]
+
+        print(f"percepts, {size}x{size} map, {len(points)} calls")
+        print(f"{'backend':<14}{'tables s':>10}{'percepts s':>12}{'calls/s':>12}")
+        for world_class in [world.World, world.CompactWorld]:
+            the_world = load(world_class, filename)
+
+            start = time.perf_counter()
+            if isinstance(the_world, world.CompactWorld):
+                the_world.build_wall_distances()
+            tables = time.perf_counter() - start
+
+            def percepts():
+                for x, y in points:
+                    sim.get_percepts(the_world, x, y, 'N')
+
+            elapsed = best_time(percepts)
+            print(
+                f"{world_class.__name__:<14}"
+                f"{tables:>10.3f}"
+                f"{elapsed:>12.4f}"
+                f"{len(points) / elapsed:>12.0f}"
+            )
+
+
+def bench_load(size=2000):
+    # Load time of the text format against the memory-mapped binary format.
+    with tempfile.TemporaryDirectory() as tmp:
+        text_filename = os.path.join(tmp, "world")
+        binary_filename = os.path.join(tmp, "world.mwb")
+        write_random_world(text_filename, size, size)
+        write_random_world(binary_filename, size, size, binary=True)
+
+        print(f"load, {size}x{size} map")
+        print(f"{'format':<22}{'file MB':>10}{'load ms':>10}")
+        for name, world_class, filename in [
+            ("text / World", world.World, text_filename),
+            ("text / CompactWorld", world.CompactWorld, text_filename),
+            ("binary / BinaryWorld", world.BinaryWorld, binary_filename),
+        ]:
+            size_mb = os.path.getsize(filename) / 2**20
+            elapsed = best_time(lambda: load(world_class, filename), 3)
+            print(f"{name:<22}{size_mb:>10.1f}{elapsed * 1000:>10.2f}")
+
+
+def bench_generator(size=2000):
+    print(f"generator, {size}x{size} map")
+    print(f"{'style':<10}{'exit':<8}{'generate s':>12}")
+    for style, exit_placement in [('maze', 'random'), ('maze', 'far'), ('random', 'random')]:
+        elapsed = best_time(
+            lambda: generator.generate_world(size, size, 0, style, exit_placement=exit_placement), 1
+        )
+        print(f"{style:<10}{exit_placement:<8}{elapsed:>12.2f}")
+
+
+def bench_snapshot(size=1000, episodes=20):
+    # Getting a pristine world for each episode: reloading the file against
+    # fork() and reset() after a few goal pickups.
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "world")
+        write_random_world(filename, size, size)
+        base = load(world.CompactWorld, filename)
+        base.build_wall_distances()
+
+        def play(the_world):
+            for flag in ['0', '1', '2']:
+                xy = the_world.find_cell(flag)
+                if xy is not None:
+                    the_world.check_triggers(xy[0], xy[1], 'U')
+                the_world.cast_ray(1, 1, 1, 0)
+
+        def reload():
+            for _ in range(episodes):
+                the_world = load(world.CompactWorld, filename)
+                play(the_world)
+
+        def fork():
+            for _ in range(episodes):
+                play(base.fork())
+
+        the_world = base.fork()
+
+        def reset():
+            for _ in range(episodes):
+                play(the_world)
+                the_world.reset()
+
+        print(f"snapshot, {size}x{size} map, {episodes} episodes")
+        print(f"{'method':<10}{'ms/episode':>12}")
+        for name, fn in [("reload", reload), ("fork", fork), ("reset", reset)]:
+            print(f"{name:<10}{best_time(fn) / episodes * 1000:>12.3f}")
+
+
+def bench_vecsim(size=32, max_turns=200):
+    # Episodes per second of the NumPy engine with a vectorized random policy
+    import vecsim
+
+    maps = [generator.generate_world(size, size, seed, goals=3) for seed in range(8)]
+    print(f"vecsim, {size}x{size} maps, {max_turns} turns")
+    print(f"{'envs':>8}{'run s':>10}{'env steps/s':>14}{'episodes/s':>12}")
+    for n in [100, 1000, 4000]:
+        vsim = vecsim.VecSim([maps[i % len(maps)] for i in range(n)], max_turns)
+        start = time.perf_counter()
+        vsim.run(vecsim.random_policy(0))
+        elapsed = time.perf_counter() - start
+        steps = int(vsim.turns.sum())
+        print(f"{n:>8}{elapsed:>10.3f}{steps / elapsed:>14.0f}{n / elapsed:>12.0f}")
+
+
+def run_quiet(the_world, max_turns, log, seed=0, **kwargs):
+    # One run_sim episode with the agents' prints thrown away
+    random.seed(seed)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return sim.run_sim(the_world, max_turns, log, **kwargs)
+
+
+def bench_logging(size=64, max_turns=1000):
+    # Turns per second of run_sim for each log level, against writing and
+    # flushing every line.
+    base = generator.generate_world(size, size, 0, goals=5)
+    print(f"logging, {size}x{size} maze, {max_turns} turns")
+    print(f"{'mode':<22}{'log KB':>10}{'turns/s':>10}{'log turns/s':>16}")
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "log")
+        for name, level, buffer_size in [
+            ("unbuffered percepts", simlog.PERCEPTS, 0),
+            ("percepts", simlog.PERCEPTS, 1 << 16),
+            ("turns", simlog.TURNS, 1 << 16),
+            ("summary", simlog.SUMMARY, 1 << 16),
+            ("off", simlog.OFF, 1 << 16),
+        ]:
+            def episode():
+                with open(filename, 'w') as f:
+                    return run_quiet(base.fork(), max_turns, simlog.SimLog(f, level, buffer_size))
+
+            turns = episode()['turns']
+            elapsed = best_time(episode)
+            size_kb = os.path.getsize(filename) / 1024
+
+            # The log calls of one turn on their own, without the agents
+            percepts = sim.get_percepts(base, base.start_xA, base.start_yA, 'N')
+
+            def log_only():
+                with open(filename, 'w') as f:
+                    log = simlog.SimLog(f, level, buffer_size)
+                    for turn in range(1, max_turns + 1):
+                        log.write(simlog.TURNS, "-----Turn {}-----", turn)
+                        for agent in "AB":
+                            log.write(simlog.TURNS, "Agent {}", agent)
+                            log.write(simlog.TURNS, "   Start:    {},{}", 1, 1)
+                            if log.enabled(simlog.PERCEPTS):
+                                log.write(simlog.PERCEPTS, "   Percepts: {}", simlog.format_percepts(percepts))
+                            log.write(simlog.TURNS, "   Command:  {}", 'N')
+                            log.write(simlog.TURNS, "   End:      {},{}", 1, 2)
+                        log.end_turn()
+                    log.close()
+
+            log_elapsed = best_time(log_only)
+            print(
+                f"{name:<22}{size_kb:>10.1f}{turns / elapsed:>10.0f}"
+                f"{max_turns / log_elapsed:>16.0f}"
+            )
+
+
+def bench_trace(records=200000):
+    # Writing and streaming back the structured trace in each format
+    print(f"trace, {records} records")
+    print(f"{'format':<14}{'file KB':>10}{'write s':>10}{'read s':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ["trace.mwt", "trace.mwt.gz", "trace.jsonl", "trace.jsonl.gz"]:
+            filename = os.path.join(tmp, name)
+
+            def write():
+                trace = simtrace.open_trace(filename)
+                for i in range(records):
+                    turn = i // 2 + 1
+                    trace.record(turn, i % 2, (turn % 50, 7), (turn % 50 + 1, 7), 'E', 'NONE', i % 300)
+                trace.close()
+
+            def read():
+                for record in simtrace.read_trace(filename):
+                    pass
+
+            write_time = best_time(write, 1)
+            read_time = best_time(read, 1)
+            size_kb = os.path.getsize(filename) / 1024
+            print(f"{name:<14}{size_kb:>10.0f}{write_time:>10.3f}{read_time:>10.3f}")
+
+
+def bench_agents(size=64, max_turns=300):
+    # run_sim with 2, 8 and 32 agents alternating between aiA and aiB
+    base = generator.generate_world(size, size, 0, goals=5)
+    print(f"agents, {size}x{size} maze, {max_turns} turns")
+    print(f"{'agents':>8}{'turns':>8}{'run s':>10}{'agent turns/s':>16}")
+    for n in [2, 8, 32]:
+        modules = [aiA, aiB] * (n // 2)
+        log = simlog.SimLog(level=simlog.OFF)
+        start = time.perf_counter()
+        result = run_quiet(base.fork(), max_turns, log, ai_modules=modules)
+        elapsed = time.perf_counter() - start
+        print(f"{n:>8}{result['turns']:>8}{elapsed:>10.3f}{n * result['turns'] / elapsed:>16.0f}")
+
+
+def heavy_module(module, work):
+    # An AI module whose agents burn CPU on every decision
+    class AI:
+        def __init__(self, max_turns):
+            self.ai = module.AI(max_turns)
+
+        def update(self, percepts, msg):
+            total = 0
+            for i in range(work):
+                total += i * i
+            return self.ai.update(percepts, msg)
+
+    return types.SimpleNamespace(AI=AI)
+
+
+def bench_simultaneous(size=64, max_turns=200, work=100000):
+    # Sequential turns against simultaneous ones on threads and processes,
+    # with agents that each burn CPU on every decision
+    base = generator.generate_world(size, size, 0, goals=5)
+    modules = [heavy_module(aiA, work), heavy_module(aiB, work)]
+    print(f"simultaneous, {size}x{size} maze, {max_turns} turns, {work} work per update")
+    print(f"{'mode':<22}{'turns':>8}{'run s':>10}{'ms/turn':>10}")
+    modes = [
+        ("sequential", None, False),
+        ("simultaneous threads", lambda: agentrunner.TimeBudget(), True),
+        ("simultaneous procs", lambda: agentrunner.TimeBudget(processes=True), True),
+    ]
+    for name, make_budget, simultaneous in modes:
+        log = simlog.SimLog(level=simlog.OFF)
+        budget = make_budget() if make_budget is not None else None
+        start = time.perf_counter()
+        result = run_quiet(
+            base.fork(), max_turns, log, ai_modules=modules, budget=budget, simultaneous=simultaneous
+        )
+        elapsed = time.perf_counter() - start
+        print(f"{name:<22}{result['turns']:>8}{elapsed:>10.3f}{1000 * elapsed / result['turns']:>10.2f}")
+
+
+def bench_timing(size=64, max_turns=1000):
+    # Cost of per-phase timing in run_sim, against running without it
+    base = generator.generate_world(size, size, 0, goals=5)
+    print(f"timing, {size}x{size} maze, {max_turns} turns")
+    print(f"{'timing':<10}{'run s':>10}")
+    for enabled in [False, True]:
+        elapsed = best_time(lambda: run_quiet(
+            base.fork(), max_turns, simlog.SimLog(level=simlog.OFF),
+            timing=timing.Timing() if enabled else None
+        ))
+        print(f"{'on' if enabled else 'off':<10}{elapsed:>10.3f}")
+
+
+def message_sizes(module, sizes):
+    # An AI module that records the size of every message its agents send
+    class AI:
+        def __init__(self, max_turns):
+            self.ai = module.AI(max_turns)
+
+        def update(self, percepts, msg):
+            cmd, msg = self.ai.update(percepts, msg)
+            sizes.append(simtrace.message_size(msg))
+            return cmd, msg
+
+    return types.SimpleNamespace(AI=AI)
+
+
+def bench_messages(size=200, max_turns=3000):
+    # Full knowledge in every message (a resync every message) against deltas
+    base = generator.generate_world(size, size, 0, style='random', wall_density=0.2, goals=5)
+    print(f"messages, {size}x{size} map, {max_turns} turns")
+    print(f"{'protocol':<10}{'turns':>8}{'run s':>10}{'items/msg':>11}{'last 10%':>10}{'max':>8}")
+    resync_every = agentmsg.RESYNC_EVERY
+    for name, every in [("full", 1), ("delta", resync_every)]:
+        agentmsg.RESYNC_EVERY = every
+        sizes = []
+        modules = [message_sizes(aiA, sizes), message_sizes(aiB, sizes)]
+        try:
+            start = time.perf_counter()
+            result = run_quiet(base.fork(), max_turns, simlog.SimLog(level=simlog.OFF), ai_modules=modules)
+            elapsed = time.perf_counter() - start
+        finally:
+            agentmsg.RESYNC_EVERY = resync_every
+        tail = sizes[-max(1, len(sizes) // 10):]
+        print(
+            f"{name:<10}{result['turns']:>8}{elapsed:>10.3f}{sum(sizes) / len(sizes):>11.1f}"
+            f"{sum(tail) / len(tail):>10.1f}{max(sizes):>8}"
+        )
+
+
+class BlindMap(knownmap.KnownMap):
+    # Every cell counts as free, as the agents planned before they kept a map
+    def is_free(self, cell):
+        return True
+
+
+def known_room(ai, radius):
+    # Marks a square room of free cells around (0, 0) as seen
+    for row in range(-radius, radius + 1):
+        for col in range(-radius, radius + 1):
+            ai.known.set((row, col), knownmap.FREE)
+
+
+def a_star_search(known, start, targets):
+    """
+    The direction of the first step from start toward the nearest target
+    over known free cells, by A* from scratch with a FrontierIndex for the
+    heuristic, as the agents planned before DStarLite. 'N' if start is a
+    target, None if no target can be reached.
+    """
+    goals = set(targets)
+    index = knownmap.FrontierIndex(goals)
+    open_set = [(0, start)]
+    previous = {start: None}
+    cost = {start: 0}
+    closed = set()
+    while open_set:
+        _, current = heapq.heappop(open_set)
+        if current in closed:
+            continue
+        closed.add(current)
+        if current in goals:
+            if current == start:
+                return 'N'
+            while previous[current] != start:
+                current = previous[current]
+            step = (current[0] - start[0], current[1] - start[1])
+            return next(direction for direction, d in knownmap.STEPS.items() if d == step)
+        for n in knownmap.neighbors(current):
+            if not known.is_free(n):
+                continue
+            new_cost = cost[current] + 1
+            if n not in cost or new_cost < cost[n]:
+                cost[n] = new_cost
+                previous[n] = current
+                heapq.heappush(open_set, (new_cost + index.distance(n), n))
+    return None
+
+
+def planner_module(module, blind, stats):
+    # An AI module that plans every step with a_star_search instead of its
+    # D* Lite planners, and counts its agents' searches and the ones whose
+    # first step is into a wall
+    class AI(module.AI):
+        def __init__(self, max_turns):
+            super().__init__(max_turns)
+            if blind:
+                self.known = BlindMap()
+
+        def update(self, percepts, msg):
+            self.percepts = percepts
+            return super().update(percepts, msg)
+
+        def plan(self, planner, targets):
+            begin = time.perf_counter()
+            move = a_star_search(self.known, self.position, targets)
+            stats['times'].append(time.perf_counter() - begin)
+            if move is None:
+                stats['none'] += 1
+            elif self.percepts[move][0] == 'w':
+                stats['walls'] += 1
+            return move
+
+    return types.SimpleNamespace(AI=AI)
+
+
+def bench_knownmap(size=64, max_turns=1000):
+    # A* over every cell as free against A* over the cells the agents know
+    # are free, then searches with no path through known rooms of growing size
+    base = generator.generate_world(size, size, 0, goals=5)
+    print(f"knownmap, {size}x{size} maze, {max_turns} turns")
+    print(f"{'planner':<10}{'turns':>8}{'total':>8}{'run s':>10}{'searches':>10}{'into wall':>11}{'no path':>9}{'max ms':>9}")
+    for name, blind in [("blind", True), ("known", False)]:
+        stats = {'times': [], 'walls': 0, 'none': 0}
+        modules = [planner_module(aiA, blind, stats), planner_module(aiB, blind, stats)]
+        start = time.perf_counter()
+        result = run_quiet(base.fork(), max_turns, simlog.SimLog(level=simlog.OFF), ai_modules=modules)
+        elapsed = time.perf_counter() - start
+        searches = len(stats['times'])
+        print(
+            f"{name:<10}{result['turns']:>8}{result['total']:>8}{elapsed:>10.3f}{searches:>10}"
+            f"{stats['walls']:>11}{stats['none']:>9}{1000 * max(stats['times'], default=0):>9.2f}"
+        )
+
+    print(f"{'room':<10}{'known':>8}{'no path ms':>12}")
+    for radius in [10, 40, 160]:
+        ai = aiA.AI(max_turns)
+        known_room(ai, radius)
+        target = [(radius + 2, 0)]
+        elapsed = best_time(lambda: a_star_search(ai.known, (0, 0), target))
+        print(f"{radius:<10}{ai.known.free_count:>8}{1000 * elapsed:>12.2f}")
+
+
+class ScanIndex(knownmap.FrontierIndex):
+    # The nearest frontier cell by a min() over all of them, as before the index
+    def distance(self, cell):
+        return self.scan(cell)
+
+
+def bench_frontier(maps=(('random', 256), ('random', 512), ('maze', 256)), max_turns=5000):
+    # The A* heuristic by scanning the whole frontier against the bucket
+    # index, over long episodes on large maps
+    print(f"frontier, {max_turns} turns")
+    print(f"{'map':<8}{'size':>6}{'heuristic':>11}{'turns':>8}{'total':>8}{'run s':>10}{'search s':>10}{'max ms':>9}")
+    index = knownmap.FrontierIndex
+    for style, size in maps:
+        base = generator.generate_world(size, size, 0, style=style, wall_density=0.2, goals=5)
+        for name, index_class in [("scan", ScanIndex), ("buckets", index)]:
+            stats = {'times': [], 'walls': 0, 'none': 0}
+            modules = [planner_module(aiA, False, stats), planner_module(aiB, False, stats)]
+            knownmap.FrontierIndex = index_class
+            try:
+                start = time.perf_counter()
+                result = run_quiet(base.fork(), max_turns, simlog.SimLog(level=simlog.OFF), ai_modules=modules)
+                elapsed = time.perf_counter() - start
+            finally:
+                knownmap.FrontierIndex = index
+            print(
+                f"{style:<8}{size:>6}{name:>11}{result['turns']:>8}{result['total']:>8}{elapsed:>10.3f}"
+                f"{sum(stats['times']):>10.3f}{1000 * max(stats['times'], default=0):>9.2f}"
+            )
+
+
+def shadow_planner_module(module, calls):
+    # An AI module that plans with its D* Lite planners as usual, and also
+    # from scratch with a_star_search on the same state. Each call adds
+    # (cells repaired, D* expansions, D* seconds, A* seconds) to calls.
+    class AI(module.AI):
+        def plan(self, planner, targets):
+            expanded = planner.expanded
+            start = time.perf_counter()
+            move = planner.next_move(self.position, targets)
+            incremental = time.perf_counter() - start
+            start = time.perf_counter()
+            a_star_search(self.known, self.position, targets)
+            scratch = time.perf_counter() - start
+            calls.append((planner.changed, planner.expanded - expanded, incremental, scratch))
+            return move
+
+    return types.SimpleNamespace(AI=AI)
+
+
+def print_plans(calls, groups):
+    print(f"{'changed':>9}{'plans':>8}{'expanded':>10}{'D* ms':>9}{'A* ms':>9}{'D* max':>9}{'A* max':>9}")
+    for low, high in groups + [(0, None)]:
+        group = [c for c in calls if c[0] >= low and (high is None or c[0] <= high)]
+        if not group:
+            continue
+        if (low, high) == (0, None):
+            label = "all"
+        elif high is None:
+            label = f"{low}+"
+        else:
+            label = f"{low}-{high}"
+        print(
+            f"{label:>9}{len(group):>8}{sum(c[1] for c in group) / len(group):>10.1f}"
+            f"{1000 * sum(c[2] for c in group) / len(group):>9.3f}{1000 * sum(c[3] for c in group) / len(group):>9.3f}"
+            f"{1000 * max(c[2] for c in group):>9.2f}{1000 * max(c[3] for c in group):>9.2f}"
+        )
+
+
+def farthest_cell(known, start):
+    # The known free cell furthest from start by path, by breadth first search
+    distances = {start: 0}
+    queue = [start]
+    for cell in queue:
+        for n in knownmap.neighbors(cell):
+            if known.is_free(n) and n not in distances:
+                distances[n] = distances[cell] + 1
+                queue.append(n)
+    return queue[-1], distances[queue[-1]]
+
+
+def bench_dstar(size=500, max_turns=2000, window=150, steps=300):
+    """
+    Planning from scratch with A* against repairing the last search with
+    D* Lite, on the same states. First a whole episode by how many cells
+    (map changes and goals gained or lost) the planner had to repair, then
+    a walk across a known part of the maze to its furthest cell, where
+    nothing changes between steps.
+    """
+    base = generator.generate_world(size, size, 0, goals=5)
+    calls = []
+    modules = [shadow_planner_module(aiA, calls), shadow_planner_module(aiB, calls)]
+    result = run_quiet(base.fork(), max_turns, simlog.SimLog(level=simlog.OFF), ai_modules=modules)
+    print(f"dstar, {size}x{size} maze, {result['turns']} turns, {len(calls)} plans")
+    print_plans(calls, [(0, 2), (3, 5), (6, 10), (11, None)])
+
+    known = knownmap.KnownMap()
+    for y in range(window):
+        for x in range(window):
+            known.set((y, x), knownmap.WALL if base.get_cell(x, y) == 'w' else knownmap.FREE)
+    position = next((row, col) for row in range(window) for col in range(window) if known.is_free((row, col)))
+    target, length = farthest_cell(known, position)
+    planner = dstar.DStarLite(known)
+    calls = []
+    for _ in range(min(steps, length)):
+        expanded = planner.expanded
+        start = time.perf_counter()
+        move = planner.next_move(position, [target])
+        incremental = time.perf_counter() - start
+        start = time.perf_counter()
+        a_star_search(known, position, [target])
+        scratch = time.perf_counter() - start
+        calls.append((planner.changed, planner.expanded - expanded, incremental, scratch))
+        d_row, d_col = knownmap.STEPS[move]
+        position = (position[0] + d_row, position[1] + d_col)
+    print(f"walk, {window}x{window} known, path of {length}, {len(calls)} steps")
+    print_plans(calls[:1], [])
+    print_plans(calls[1:], [])
+
+
+def cache_module(module, cached, agents, stats):
+    # An AI module that times its agents' planning, keeps the agents in
+    # agents, and with cached off asks the planner every step
+    class AI(module.AI):
+        def __init__(self, max_turns):
+            super().__init__(max_turns)
+            agents.append(self)
+
+        def plan(self, planner, targets):
+            start = time.perf_counter()
+            if cached:
+                move = super().plan(planner, targets)
+            else:
+                move = planner.next_move(self.position, targets)
+            stats['time'] += time.perf_counter() - start
+            stats['plans'] += 1
+            return move
+
+    return types.SimpleNamespace(AI=AI)
+
+
+def bench_pathcache(maps=(('random', 200), ('maze', 500)), max_turns=3000):
+    # Planning every step against following a committed path until it is
+    # invalidated, with the cache's hits, replans and why paths were dropped
+    print(f"pathcache, {max_turns} turns")
+    reasons = pathcache.INVALIDATION_REASONS
+    print(
+        f"{'map':<8}{'size':>6}{'mode':>8}{'turns':>8}{'total':>8}{'plans':>8}{'plan s':>9}{'hits':>8}{'replans':>9}  "
+        + " ".join(reasons)
+    )
+    for style, size in maps:
+        base = generator.generate_world(size, size, 0, style=style, wall_density=0.2, goals=5)
+        for name, cached in [("replan", False), ("cached", True)]:
+            agents = []
+            stats = {'time': 0.0, 'plans': 0}
+            modules = [cache_module(aiA, cached, agents, stats), cache_module(aiB, cached, agents, stats)]
+            result = run_quiet(base.fork(), max_turns, simlog.SimLog(level=simlog.OFF), ai_modules=modules)
+            hits = sum(a.path_cache.hits for a in agents)
+            replans = sum(a.path_cache.replans for a in agents) if cached else stats['plans']
+            dropped = " ".join(f"{sum(a.path_cache.invalidations[r] for a in agents):>{len(r)}}" for r in reasons)
+            print(
+                f"{style:<8}{size:>6}{name:>8}{result['turns']:>8}{result['total']:>8}{stats['plans']:>8}"
+                f"{stats['time']:>9.3f}{hits:>8}{replans:>9}  {dropped}"
+            )
+
+
+class CoverageTrace:
+    """
+    A run_sim trace that keeps which open cells of the world the agents
+    have seen, and the turn they first saw the exit and reached each
+    fraction of COVERAGE_LEVELS.
+    """
+
+    def __init__(self, the_world):
+        self.world = the_world
+        self.open = sum(
+            1 for y in range(the_world.height) for x in range(the_world.width)
+            if the_world.get_cell(x, y) != 'w'
+        )
+        self.seen = set()
+        self.exit_seen = None
+        self.reached = {}
+
+    def see(self, turn, x, y):
+        self.seen.add((x, y))
+        for dx, dy in sim.DIRECTIONS.values():
+            cx, cy = x, y
+            for flag in self.world.cast_ray(x, y, dx, dy):
+                cx += dx
+                cy += dy
+                if flag == 'w':
+                    break
+                self.seen.add((cx, cy))
+                if flag == 'r' and self.exit_seen is None:
+                    self.exit_seen = turn
+        for level in COVERAGE_LEVELS:
+            if level not in self.reached and len(self.seen) >= level * self.open:
+                self.reached[level] = turn
+
+    def record(self, turn, agent, start, end, command, trigger, msg_size):
+        if start[0] is not None:
+            self.see(turn, *start)
+
+
+COVERAGE_LEVELS = [0.5, 0.75, 0.9]
+
+
+class FirstCellMap(knownmap.KnownMap):
+    # Takes in only the cell next to the agent in each direction, as the
+    # agents did before they read whole rays
+    def ingest(self, position, percepts):
+        marks = []
+        self.set(position, knownmap.FREE)
+        if percepts['X'][0] != knownmap.FLOOR_FLAG:
+            marks.append((position, percepts['X'][0]))
+        for direction, (d_row, d_col) in knownmap.STEPS.items():
+            ray = percepts.get(direction)
+            if ray:
+                cell = (position[0] + d_row, position[1] + d_col)
+                if ray[0] == knownmap.WALL_FLAG:
+                    self.set(cell, knownmap.WALL)
+                else:
+                    self.set(cell, knownmap.FREE)
+                    if ray[0] != knownmap.FLOOR_FLAG:
+                        marks.append((cell, ray[0]))
+        return marks
+
+
+def ray_module(module, full, stats):
+    # An AI module that times its agents' updates, with full rays or only
+    # the first cell of each
+    class AI(module.AI):
+        def __init__(self, max_turns):
+            super().__init__(max_turns)
+            if not full:
+                self.known = FirstCellMap()
+                self.frontier_planner = dstar.DStarLite(self.known)
+                self.exit_planner = dstar.DStarLite(self.known)
+                self.path_cache = pathcache.PathCache(self.known)
+
+        def update(self, percepts, msg):
+            start = time.perf_counter()
+            result = super().update(percepts, msg)
+            stats['time'] += time.perf_counter() - start
+            stats['updates'] += 1
+            return result
+
+    return types.SimpleNamespace(AI=AI)
+
+
+def bench_rays(max_turns=1000, seeds=3):
+    # Turns to see the exit and to see given fractions of the open cells,
+    # taking in only the first cell of each ray against whole rays, on the
+    # worlds shipped in worlds/ and on generated maps
+    maps = [(name, lambda name=name: load(world.CompactWorld, os.path.join("worlds", name)))
+            for name in sorted(os.listdir("worlds"))]
+    maps += [(f"{style}{size}", lambda style=style, size=size: generator.generate_world(
+                size, size, 0, style=style, wall_density=0.3, goals=5))
+             for style, size in [('random', 64), ('maze', 64), ('random', 128)]]
+    print(f"rays, {max_turns} turns, seeds 0-{seeds - 1}, turns averaged over seeds that got there")
+    levels = "".join(f"{f'{level:.0%} seen':>10}" for level in COVERAGE_LEVELS)
+    print(f"{'map':<16}{'rays':>6}{'exit seen':>11}{levels}{'total':>8}{'us/update':>11}")
+    for name, make in maps:
+        base = make()
+        for label, full in [("first", False), ("full", True)]:
+            stats = {'time': 0.0, 'updates': 0}
+            exits, reached, total = [], {level: [] for level in COVERAGE_LEVELS}, 0
+            for seed in range(seeds):
+                the_world = base.fork() if isinstance(base, world.CompactWorld) else make()
+                trace = CoverageTrace(the_world)
+                modules = [ray_module(aiA, full, stats), ray_module(aiB, full, stats)]
+                result = run_quiet(the_world, max_turns, simlog.SimLog(level=simlog.OFF), seed=seed, ai_modules=modules, trace=trace)
+                total += result['total']
+                if trace.exit_seen is not None:
+                    exits.append(trace.exit_seen)
+                for level in COVERAGE_LEVELS:
+                    if level in trace.reached:
+                        reached[level].append(trace.reached[level])
+
+            def mean(turns):
+                return f"{sum(turns) / len(turns):.0f}" + ("" if len(turns) == seeds else f"({len(turns)})") if turns else "-"
+
+            print(
+                f"{name:<16}{label:>6}{mean(exits):>11}" + "".join(f"{mean(reached[level]):>10}" for level in COVERAGE_LEVELS)
+                + f"{total / seeds:>8.0f}{1e6 * stats['time'] / stats['updates']:>11.1f}"
+            )
+
+
+# The benchmark suite: fixed seeds and sizes, results saved as JSON and
+# compared against a baseline run.
+SUITE_VERSION = 2
+SUITE_SIZES = [32, 128, 512]
+SUITE_EPISODE_SIZES = [32, 128]
+SUITE_THRESHOLD = 0.10
+
+
+def time_call(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def open_cells(the_world, n, seed):
+    rng = random.Random(seed)
+    cells = []
+    while len(cells) < n:
+        x = rng.randrange(the_world.width)
+        y = rng.randrange(the_world.height)
+        if the_world.is_cell_enterable(x, y):
+            cells.append((x, y))
+    return cells
+
+
+def recorded_updates(module, size, turns):
+    # The (percepts, msg) calls one agent of module gets in a fixed episode
+    calls = []
+
+    class Recording:
+        def __init__(self, max_turns):
+            self.ai = module.AI(max_turns)
+
+        def update(self, percepts, msg):
+            # Messages share sets that the sender keeps changing
+            calls.append((copy.deepcopy(percepts), copy.deepcopy(msg)))
+            return self.ai.update(percepts, msg)
+
+    the_world = generator.generate_world(size, size, 0, goals=5)
+    modules = [types.SimpleNamespace(AI=Recording), aiB if module is aiA else aiA]
+    run_quiet(the_world, turns, simlog.SimLog(level=simlog.OFF), ai_modules=modules)
+    return calls
+
+
+def suite_cases(tmp):
+    """
+    Yields (name, setup) pairs. setup() does the case's preparation and
+    returns case, where case() runs the benchmark once and returns the
+    seconds spent in the timed part. Nothing is prepared until a setup is
+    called, so cases left out by name cost nothing.
+    """
+    for size in SUITE_SIZES:
+
+        def random_file(size=size):
+            filename = os.path.join(tmp, f"world{size}")
+            if not os.path.exists(filename):
+                write_random_world(filename, size, size)
+            return filename
+
+        for world_class in [world.World, world.CompactWorld]:
+
+            def load_world(world_class=world_class, random_file=random_file):
+                filename = random_file()
+                return lambda: time_call(lambda: load(world_class, filename))
+
+            yield f"load_world/{world_class.__name__}/{size}", load_world
+
+        for world_class in [world.World, world.CompactWorld]:
+
+            def percepts(world_class=world_class, random_file=random_file, size=size):
+                the_world = load(world_class, random_file())
+                if isinstance(the_world, world.CompactWorld):
+                    the_world.build_wall_distances()
+                cells = open_cells(the_world, 2000, size)
+
+                def run():
+                    for x, y in cells:
+                        sim.get_percepts(the_world, x, y, 'N')
+
+                return lambda: time_call(run)
+
+            yield f"get_percepts/{world_class.__name__}/{size}", percepts
+
+        def teleports(random_file=random_file):
+            base = load(world.CompactWorld, random_file())
+            base.make_pristine()
+            x, y = base.find_cell('b')
+
+            def run():
+                for _ in range(2000):
+                    base.check_triggers(x, y, 'U')
+
+            return lambda: time_call(run)
+
+        yield f"check_triggers/teleport/{size}", teleports
+
+        def goals(random_file=random_file):
+            base = load(world.CompactWorld, random_file())
+            base.make_pristine()
+            x, y = base.find_cell(base.goals[0])
+
+            def run():
+                # Triggering a goal changes the world, so every call gets a fork
+                forks = [base.fork() for _ in range(200)]
+                start = time.perf_counter()
+                for the_world in forks:
+                    the_world.check_triggers(x, y, 'U')
+                return time.perf_counter() - start
+
+            return run
+
+        yield f"check_triggers/goal/{size}", goals
+
+    for size in SUITE_EPISODE_SIZES:
+
+        def maze_file(size=size):
+            filename = os.path.join(tmp, f"maze{size}")
+            if not os.path.exists(filename):
+                generator.save_world(generator.generate_world(size, size, 0, goals=5), filename)
+            return filename
+
+        for level in [simlog.OFF, simlog.PERCEPTS]:
+
+            def episode(maze_file=maze_file, level=level):
+                filename = maze_file()
+
+                def run():
+                    the_world = load(world.World, filename)
+                    with open(os.devnull, 'w') as devnull:
+                        log = simlog.SimLog(devnull, level)
+                        return time_call(lambda: run_quiet(the_world, 300, log))
+
+                return run
+
+            yield f"run_sim/log_{'off' if level == simlog.OFF else 'on'}/{size}", episode
+
+    for module in [aiA, aiB]:
+        name = module.__name__
+        for radius in [10, 40]:
+
+            def search(module=module, radius=radius):
+                # A frontier ring around the agent, as after exploring a room
+                ai = module.AI(1000)
+                ai.position = (0, 0)
+                known_room(ai, radius)
+                frontier = {(radius, c) for c in range(-radius, radius + 1, 4)}
+
+                def run():
+                    for _ in range(20):
+                        a_star_search(ai.known, ai.position, frontier)
+
+                return lambda: time_call(run)
+
+            yield f"a_star_search/{name}/{radius}", search
+
+        def updates(module=module):
+            calls = recorded_updates(module, 64, 300)
+
+            def run():
+                ai = module.AI(300)
+                random.seed(0)
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    start = time.perf_counter()
+                    for percepts, msg in calls:
+                        ai.update(percepts, msg)
+                    return time.perf_counter() - start
+
+            return run
+
+        yield f"update/{name}/64", updates
+
+
+def run_suite(repeat=5, only=None):
+    # Best time of each case over repeat runs, by case name
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, setup in suite_cases(tmp):
+            if only is not None and not name.startswith(only):
+                continue
+            case = setup()
+            results[name] = min(case() for _ in range(repeat))
+            print(f"{name:<36}{results[name]:>12.6f}")
+    return results
+
+
+def write_suite(results, filename):
+    with open(filename, 'w') as f:
+        json.dump({
+            'version': SUITE_VERSION,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+
+
+def read_suite(filename):
+    with open(filename) as f:
+        data = json.load(f)
+    if data.get('version') != SUITE_VERSION:
+        raise ValueError(f"{filename} has unsupported suite version {data.get('version')}.")
+    return data['results']
+
+
+def compare_suite(results, baseline, threshold=SUITE_THRESHOLD):
+    """
+    Prints every case against the baseline and returns the names of the
+    cases that got slower by more than threshold (0.10 is 10%).
+    """
+    regressions = []
+    print(f"{'case':<36}{'baseline s':>12}{'current s':>12}{'change':>9}")
+    for name, elapsed in results.items():
+        if name not in baseline:
+            print(f"{name:<36}{'-':>12}{elapsed:>12.6f}{'new':>9}")
+            continue
+        change = elapsed / baseline[name] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<36}{baseline[name]:>12.6f}{elapsed:>12.6f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def suite_main(args):
+    output_filename = None
+    baseline_filename = None
+    threshold = SUITE_THRESHOLD
+    repeat = 5
+    only = None
+
+    i = 0
+    while i < len(args):
+        try:
+            if args[i] == "-o":
+                output_filename = args[i+1]
+            elif args[i] == "-b":
+                baseline_filename = args[i+1]
+            elif args[i] == "-x":
+                threshold = float(args[i+1])
+            elif args[i] == "-n":
+                repeat = int(args[i+1])
+            elif args[i] == "-k":
+                only = args[i+1]
+            elif args[i] == "-h":
+                print("Usage: python bench.py suite [-o <results json>] [-b <baseline json>]")
+                print("       [-x <regression threshold, 0.1 = 10%>] [-n <repeats>] [-k <case prefix>]")
+                return 0
+        except (IndexError, ValueError):
+            print("Incorrect command line arguments. Run with -h for help.")
+            return 2
+
+        i+=1
+
+    baseline = None
+    if baseline_filename is not None:
+        try:
+            baseline = read_suite(baseline_filename)
+        except (OSError, ValueError) as e:
+            print(e)
+            return 2
+
+    results = run_suite(repeat, only)
+    if output_filename is not None:
+        write_suite(results, output_filename)
+    if baseline is not None:
+        regressions = compare_suite(results, baseline, threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+BENCHMARKS = {
+    "grid": bench_grid_storage,
+    "percepts": bench_percepts,
+    "load": bench_load,
+    "generator": bench_generator,
+    "snapshot": bench_snapshot,
+    "vecsim": bench_vecsim,
+    "logging": bench_logging,
+    "trace": bench_trace,
+    "agents": bench_agents,
+    "simultaneous": bench_simultaneous,
+    "timing": bench_timing,
+    "messages": bench_messages,
+    "knownmap": bench_knownmap,
+    "frontier": bench_frontier,
+    "dstar": bench_dstar,
+    "pathcache": bench_pathcache,
+    "rays": bench_rays,
+}
+
+
+def main():
+    if sys.argv[1:2] == ["suite"]:
+        sys.exit(suite_main(sys.argv[2:]))
+
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark {name}. Choose from: {', '.join(BENCHMARKS)}")
+            return
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
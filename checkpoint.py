@@ -0,0 +1,138 @@
+import os
+import struct
+import pickle
+import random
+import zlib
+
+import world
+import sim
+
+# Checkpoint file: the magic, version and the turn the run resumes at, then
+# a zlib-compressed pickle of the run's state.
+CHECKPOINT_MAGIC = b"MWC1"
+CHECKPOINT_VERSION = 1
+CHECKPOINT_HEADER = struct.Struct("<4sHI")
+
+
+def changed_cells(the_world, pristine):
+    # (x, y, flag) of every cell that differs from the world as loaded
+    if isinstance(the_world, world.CompactWorld):
+        if the_world.cells is the_world.base.cells:
+            return [
+                (index % the_world.width, index // the_world.width, world.CELL_FLAGS[code])
+                for index, code in the_world.overlay.items()
+            ]
+        codes = the_world.cell_codes()
+        return [
+            (index % the_world.width, index // the_world.width, world.CELL_FLAGS[code])
+            for index, code in enumerate(codes)
+            if code != the_world.base.cells[index]
+        ]
+    return [
+        (x, y, the_world.world_map[y][x])
+        for y in range(the_world.height)
+        for x in range(the_world.width)
+        if the_world.world_map[y][x] != pristine.world_map[y][x]
+    ]
+
+
+class Checkpoint:
+    """
+    The state of a run between two turns: the cells that changed, the
+    goals left, the agents with their AI objects and last messages, the
+    random module's state and the turn to play next.
+    """
+
+    def __init__(self, world_filename, compact, max_turns, simultaneous, turn, cells, goals, agents, rng_state):
+        self.world_filename = world_filename
+        self.compact = compact
+        self.max_turns = max_turns
+        self.simultaneous = simultaneous
+        self.turn = turn
+        self.cells = cells
+        self.goals = goals
+        self.agents = agents
+        self.rng_state = rng_state
+
+    def restore(self, the_world):
+        """
+        Applies the checkpoint to a freshly loaded world and the random
+        module. Returns the agents and the turn to play next.
+        """
+        for x, y, flag in self.cells:
+            the_world.set_cell(x, y, flag)
+        the_world.goals = list(self.goals)
+        random.setstate(self.rng_state)
+        return self.agents, self.turn
+
+
+class Checkpointer:
+    """
+    Writes a checkpoint of a run_sim run every `every` turns. Each one
+    replaces the last, through a temporary file, so a crash leaves the
+    previous checkpoint intact.
+    """
+
+    def __init__(self, filename, every=100):
+        self.filename = filename
+        self.every = every
+        self.pristine = None
+
+    def due(self, turn):
+        return turn % self.every == 0
+
+    def save(self, the_world, max_turns, simultaneous, turn, agents):
+        if not isinstance(the_world, world.CompactWorld) and self.pristine is None:
+            self.pristine = world.World(the_world.world_filename)
+            self.pristine.load_world()
+        state = Checkpoint(
+            the_world.world_filename,
+            isinstance(the_world, world.CompactWorld),
+            max_turns,
+            simultaneous,
+            turn,
+            changed_cells(the_world, self.pristine),
+            list(the_world.goals),
+            agents,
+            random.getstate()
+        )
+        write_checkpoint(state, self.filename)
+
+
+def write_checkpoint(state, filename):
+    data = zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+    temporary = filename + ".tmp"
+    with open(temporary, 'wb') as f:
+        f.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, state.turn))
+        f.write(data)
+    os.replace(temporary, filename)
+
+
+def read_checkpoint(filename):
+    with open(filename, 'rb') as f:
+        header = f.read(CHECKPOINT_HEADER.size)
+        if len(header) < CHECKPOINT_HEADER.size or header[:len(CHECKPOINT_MAGIC)] != CHECKPOINT_MAGIC:
+            raise ValueError(f"{filename} is not a checkpoint.")
+        magic, version, turn = CHECKPOINT_HEADER.unpack(header)
+        if version != CHECKPOINT_VERSION:
+            raise ValueError(f"Checkpoint {filename} has unsupported version {version}.")
+        return pickle.loads(zlib.decompress(f.read()))
+
+
+def resume(filename, log=None, **kwargs):
+    """
+    Continues the run saved in a checkpoint file and returns run_sim's
+    results. kwargs go to run_sim, for instance a trace or a Checkpointer
+    to keep checkpointing.
+    """
+    state = read_checkpoint(filename)
+    the_world = world.make_world(state.world_filename, state.compact)
+    the_world.load_world()
+    return sim.run_sim(
+        the_world,
+        state.max_turns,
+        log,
+        simultaneous=state.simultaneous,
+        resume=state,
+        **kwargs
+    )
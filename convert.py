@@ -0,0 +1,47 @@
+import sys
+import world
+import misc
+
+def main():
+
+    world_filename = None
+    output_filename = None
+
+    args = sys.argv
+
+    if "-h" in args or len(args) == 1:
+        print("Convert a text world to the binary world format.")
+        print("Usage: python convert.py -w <text world> -o <binary world>")
+        return
+
+    i = 1
+    while i < len(args):
+        try:
+            if args[i] == "-w":
+                world_filename = args[i+1]
+            elif args[i] == "-o":
+                output_filename = args[i+1]
+        except IndexError:
+            print("Incorrect command line arguments. Run with -h for help.")
+            return
+
+        i+=1
+
+    if world_filename is None or output_filename is None:
+        print("Both -w and -o are required. Run with -h for help.")
+        return
+
+    try:
+        the_world = world.CompactWorld(world_filename)
+        the_world.load_world()
+        if not the_world.cells:
+            return
+        world.write_binary_world(the_world, output_filename)
+        print(f"Wrote {the_world.get_width()}x{the_world.get_height()} world to {output_filename}")
+    except (misc.InvalidCellException, misc.InvalidWorldException) as e:
+        print(e)
+
+
+
+if __name__ == "__main__":
+    main()
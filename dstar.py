@@ -0,0 +1,195 @@
+import heapq
+
+import knownmap
+
+INFINITY = float('inf')
+
+
+def manhattan(a, b):
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+class DStarLite:
+    """
+    D* Lite (Koenig and Likhachev) over the free cells of a KnownMap: the
+    first step from the agent to the nearest of a set of goal cells. The
+    search runs from the goals to the agent and keeps its costs between
+    calls, so a call only repairs what the map's changes, the goals that
+    came and went and the agent's move made inconsistent.
+    """
+
+    def __init__(self, known):
+        self.known = known
+        self.synced = len(known.changes)
+        self.goals = set()
+        self.g = {}
+        self.rhs = {}
+        self.queue = []
+        self.queued = {}  # Cell -> the key it is queued with, older heap entries are stale
+        self.start = None
+        self.km = 0
+        self.expanded = 0
+        self.changed = 0  # Cells whose state or goal status the last call had to repair
+
+    def update_vertex(self, cell):
+        if not self.known.is_free(cell):
+            rhs = INFINITY
+        elif cell in self.goals:
+            rhs = 0
+        else:
+            g = self.g
+            row, col = cell
+            rhs = min(
+                g.get((row - 1, col), INFINITY), g.get((row + 1, col), INFINITY),
+                g.get((row, col + 1), INFINITY), g.get((row, col - 1), INFINITY)
+            ) + 1
+        if rhs == INFINITY:
+            self.rhs.pop(cell, None)
+        else:
+            self.rhs[cell] = rhs
+        self.requeue(cell, rhs)
+
+    def requeue(self, cell, rhs):
+        # Queues the cell if it is inconsistent, drops it from the queue if not
+        g = self.g.get(cell, INFINITY)
+        if g != rhs:
+            cost = g if g < rhs else rhs
+            start = self.start
+            key = (cost + abs(start[0] - cell[0]) + abs(start[1] - cell[1]) + self.km, cost)
+            self.queued[cell] = key
+            heapq.heappush(self.queue, (key, cell))
+        else:
+            self.queued.pop(cell, None)
+
+    def compute(self):
+        start = self.start
+        start_row, start_col = start
+        queue = self.queue
+        queued = self.queued
+        g_of = self.g
+        rhs_of = self.rhs
+        km = self.km
+        heappop, heappush = heapq.heappop, heapq.heappush
+        expanded = 0
+        while queue:
+            key, cell = queue[0]
+            if queued.get(cell) != key:
+                heappop(queue)
+                continue
+            g = g_of.get(start, INFINITY)
+            if g == rhs_of.get(start, INFINITY) and key >= (g + km, g):
+                break
+            heappop(queue)
+            expanded += 1
+
+            g = g_of.get(cell, INFINITY)
+            rhs = rhs_of.get(cell, INFINITY)
+            cost = g if g < rhs else rhs
+            new_key = (cost + abs(start_row - cell[0]) + abs(start_col - cell[1]) + km, cost)
+            if key < new_key:
+                # Queued before the agent moved
+                queued[cell] = new_key
+                heappush(queue, (new_key, cell))
+                continue
+            del queued[cell]
+            if g > rhs:
+                # Neighbors can only get a lower rhs through this cell
+                g_of[cell] = rhs
+                for n in knownmap.neighbors(cell):
+                    if rhs + 1 < rhs_of.get(n, INFINITY) and self.known.is_free(n):
+                        rhs_of[n] = rhs + 1
+                        self.requeue(n, rhs + 1)
+            else:
+                # Neighbors whose rhs came through this cell look again
+                del g_of[cell]
+                self.update_vertex(cell)
+                for n in knownmap.neighbors(cell):
+                    if rhs_of.get(n) == g + 1 and n not in self.goals:
+                        self.update_vertex(n)
+        self.expanded += expanded
+
+    def update(self, start, goals):
+        # Repairs the search for the agent at start and the current goals
+        changes = self.known.changes
+        if self.start is None:
+            # Nothing searched yet, so there is nothing to repair
+            self.synced = len(changes)
+            self.start = start
+        elif start != self.start:
+            self.km += manhattan(self.start, start)
+            self.start = start
+
+        for cell in changes[self.synced:]:
+            if not self.known.is_free(cell) and self.g.pop(cell, None) is not None:
+                # A cell the search went through is blocked now
+                for n in knownmap.neighbors(cell):
+                    self.update_vertex(n)
+            # A cell that became free has no cost yet, so its neighbors keep theirs
+            self.update_vertex(cell)
+        self.changed = len(changes) - self.synced
+        self.synced = len(changes)
+
+        # The goals that came or went, without copying them all every call
+        changed = self.goals.symmetric_difference(goals)
+        self.goals ^= changed
+        for cell in changed:
+            self.update_vertex(cell)
+        self.changed += len(changed)
+
+        self.compute()
+
+    def step(self, cell):
+        # The direction and cell of the best step from a cell with a finite cost
+        best = None
+        for direction, (d_row, d_col) in knownmap.STEPS.items():
+            n = (cell[0] + d_row, cell[1] + d_col)
+            if self.known.is_free(n):
+                cost = self.g.get(n, INFINITY)
+                if best is None or cost < best[0]:
+                    best = (cost, direction, n)
+        return best[1], best[2]
+
+    def nearby(self, start, goals):
+        # The path to a goal at or next to start, which needs no search, so
+        # the repair waits for a call that does; None if there is no such goal
+        if start in goals and self.known.is_free(start):
+            return []
+        for direction, (d_row, d_col) in knownmap.STEPS.items():
+            n = (start[0] + d_row, start[1] + d_col)
+            if n in goals and self.known.is_free(n):
+                # The first goal in STEPS order, as step() would pick
+                return [(direction, n)]
+        return None
+
+    def next_move(self, start, goals):
+        """
+        The direction of the first step from start toward the nearest goal
+        over known free cells, or None if no goal can be reached.
+        """
+        steps = self.nearby(start, goals)
+        if steps is not None:
+            return steps[0][0] if steps else 'N'
+        self.update(start, goals)
+        if self.g.get(start, INFINITY) == INFINITY:
+            return None
+        if start in self.goals:
+            return 'N'  # Already at a goal
+        return self.step(start)[0]
+
+    def path(self, start, goals):
+        """
+        The whole path from start to the nearest goal as (direction, cell)
+        steps, empty if start is a goal, or None if no goal can be reached.
+        """
+        steps = self.nearby(start, goals)
+        if steps is not None:
+            return steps
+        self.update(start, goals)
+        if self.g.get(start, INFINITY) == INFINITY:
+            return None
+        steps = []
+        cell = start
+        while cell not in self.goals:
+            direction, cell = self.step(cell)
+            steps.append((direction, cell))
+        return steps
@@ -0,0 +1,260 @@
+import sys
+import random
+from array import array
+
+import world
+import misc
+
+STYLES = ['maze', 'random']
+EXIT_PLACEMENTS = ['far', 'random']
+TELEPORT_PAIRS = [('b', 'o'), ('y', 'p')]
+
+WALL = world.FLAG_TO_CODE[ord('w')]
+FLOOR = world.FLAG_TO_CODE[ord('g')]
+
+
+def generate_world(
+    width,
+    height,
+    seed=0,
+    style='maze',
+    wall_density=0.3,
+    goals=3,
+    teleport_pairs=1,
+    exit_placement='far'
+):
+    """
+    Builds a walled CompactWorld from a seed. Both agents start on the same
+    cell, and the exit, goals and teleports are only placed on cells that
+    can be reached from it.
+
+    style 'maze' carves a perfect maze (every floor cell is reachable),
+    style 'random' fills the interior with walls at wall_density.
+    exit_placement 'far' puts the exit on the reachable cell furthest from
+    the start, 'random' on any reachable cell.
+    """
+    if width < 5 or height < 5:
+        raise misc.InvalidWorldException("Generated worlds must be at least 5x5.")
+    if style not in STYLES:
+        raise misc.InvalidWorldException(f"Unknown world style {style}.")
+    if exit_placement not in EXIT_PLACEMENTS:
+        raise misc.InvalidWorldException(f"Unknown exit placement {exit_placement}.")
+    if not 0 <= goals <= len(world.World.GOAL_CELLS):
+        raise misc.InvalidWorldException(f"A world can have at most {len(world.World.GOAL_CELLS)} goals.")
+    if not 0 <= teleport_pairs <= len(TELEPORT_PAIRS):
+        raise misc.InvalidWorldException(f"A world can have at most {len(TELEPORT_PAIRS)} teleport pairs.")
+
+    rng = random.Random(seed)
+    items = 1 + goals + 2*teleport_pairs
+
+    if style == 'maze':
+        cells, start = carve_maze(width, height, rng)
+        reachable = None
+    else:
+        for _ in range(100):
+            cells = random_walls(width, height, wall_density, rng)
+            floor = [i for i in range(len(cells)) if cells[i] != WALL]
+            if not floor:
+                continue
+            start = rng.choice(floor)
+            reachable = reachable_cells(cells, width, start)
+            if len(reachable) > items:
+                break
+        else:
+            raise misc.InvalidWorldException(
+                f"Could not generate a connected world with wall density {wall_density}."
+            )
+
+    if exit_placement == 'far' or reachable is None:
+        distances = distances_from(cells, width, start)
+        if reachable is None:
+            reachable = [i for i in range(len(cells)) if distances[i] >= 0]
+        if len(reachable) <= items:
+            raise misc.InvalidWorldException(f"A {width}x{height} world is too small for {items} items.")
+    else:
+        distances = None
+
+    # Exit first, so 'far' can take the furthest cell before it is used up
+    if exit_placement == 'far':
+        exit_cell = max(reachable, key=lambda i: distances[i])
+    else:
+        exit_cell = rng.choice(reachable)
+    used = {start, exit_cell}
+    cells[exit_cell] = world.FLAG_TO_CODE[ord('r')]
+
+    flags = [str(n) for n in range(goals)]
+    for pair in TELEPORT_PAIRS[:teleport_pairs]:
+        flags += pair
+    for flag in flags:
+        cell = rng.choice(reachable)
+        while cell in used:
+            cell = rng.choice(reachable)
+        used.add(cell)
+        cells[cell] = world.FLAG_TO_CODE[ord(flag)]
+
+    the_world = world.CompactWorld(f"generated-{style}-{width}x{height}-{seed}")
+    the_world.cells = cells
+    the_world.width = width
+    the_world.height = height
+    the_world.start_xA = the_world.start_xB = start % width
+    the_world.start_yA = the_world.start_yB = start // width
+    the_world.face_dirA = the_world.face_dirB = 'E'
+    the_world.index_cells()
+    the_world.find_goals()
+    the_world.make_pristine()
+    return the_world
+
+
+def carve_maze(width, height, rng):
+    # Iterative randomized depth-first search over the cells with odd x and
+    # y, carving through the wall between a cell and the next one. The
+    # search runs on a node grid with a visited border, so it needs no
+    # bounds checks.
+    cells = bytearray([WALL]) * (width * height)
+    nodes_w = (width - 1) // 2
+    nodes_h = (height - 1) // 2
+    stride = nodes_w + 2
+    visited = bytearray([1]) * (stride * (nodes_h + 2))
+    for j in range(nodes_h):
+        visited[(j+1)*stride + 1:(j+1)*stride + 1 + nodes_w] = bytes(nodes_w)
+    # (node step, cell step) for E, W, S, N
+    moves = [(1, 1), (-1, -1), (stride, width), (-stride, -width)]
+
+    i = rng.randrange(nodes_w)
+    j = rng.randrange(nodes_h)
+    node = (j+1)*stride + i + 1
+    start = (2*j + 1)*width + 2*i + 1
+    visited[node] = 1
+    cells[start] = FLOOR
+    stack = [(node, start)]
+    randrange = rng.randrange
+    while stack:
+        node, cell = stack[-1]
+        options = [move for move in moves if not visited[node + move[0]]]
+        if options:
+            node_step, cell_step = options[randrange(len(options))]
+            node += node_step
+            visited[node] = 1
+            cells[cell + cell_step] = FLOOR
+            cell += 2*cell_step
+            cells[cell] = FLOOR
+            stack.append((node, cell))
+        else:
+            stack.pop()
+    return cells, start
+
+
+def random_walls(width, height, wall_density, rng):
+    cells = bytearray([WALL]) * (width * height)
+    for y in range(1, height - 1):
+        for x in range(1, width - 1):
+            if rng.random() >= wall_density:
+                cells[y*width + x] = FLOOR
+    return cells
+
+
+def distances_from(cells, width, start):
+    # Breadth-first search; -1 marks cells that cannot be reached
+    distances = array('i', [-1]) * len(cells)
+    distances[start] = 0
+    queue = [start]
+    steps = [1, -1, width, -width]
+    head = 0
+    while head < len(queue):
+        current = queue[head]
+        head += 1
+        d = distances[current] + 1
+        for step in steps:
+            nxt = current + step
+            if distances[nxt] < 0 and cells[nxt] != WALL:
+                distances[nxt] = d
+                queue.append(nxt)
+    return distances
+
+
+def reachable_cells(cells, width, start):
+    distances = distances_from(cells, width, start)
+    return [i for i in range(len(cells)) if distances[i] >= 0]
+
+
+def save_world(the_world, filename, binary=False):
+    if binary:
+        world.write_binary_world(the_world, filename)
+    else:
+        world.write_text_world(the_world, filename)
+
+
+def main():
+
+    output_filename = None
+    width = 32
+    height = 32
+    seed = 0
+    style = 'maze'
+    wall_density = 0.3
+    goals = 3
+    teleport_pairs = 1
+    exit_placement = 'far'
+    binary = False
+
+    args = sys.argv
+
+    if "-h" in args or len(args) == 1:
+        print("Generate a world from a seed.")
+        print("Usage: python generator.py -o <world> [-x width] [-y height] [-s seed]")
+        print("       [-m maze|random] [-d wall density] [-g goals] [-t teleport pairs]")
+        print("       [-e far|random] [-b (binary format)]")
+        return
+
+    i = 1
+    while i < len(args):
+        try:
+            if args[i] == "-o":
+                output_filename = args[i+1]
+            elif args[i] == "-x":
+                width = int(args[i+1])
+            elif args[i] == "-y":
+                height = int(args[i+1])
+            elif args[i] == "-s":
+                seed = int(args[i+1])
+            elif args[i] == "-m":
+                style = args[i+1]
+            elif args[i] == "-d":
+                wall_density = float(args[i+1])
+            elif args[i] == "-g":
+                goals = int(args[i+1])
+            elif args[i] == "-t":
+                teleport_pairs = int(args[i+1])
+            elif args[i] == "-e":
+                exit_placement = args[i+1]
+            elif args[i] == "-b":
+                binary = True
+        except (IndexError, ValueError):
+            print("Incorrect command line arguments. Run with -h for help.")
+            return
+
+        i+=1
+
+    if output_filename is None:
+        print("Output argument -o missing. Run with -h for help.")
+        return
+
+    try:
+        the_world = generate_world(
+            width,
+            height,
+            seed,
+            style,
+            wall_density,
+            goals,
+            teleport_pairs,
+            exit_placement
+        )
+        save_world(the_world, output_filename, binary)
+    except misc.InvalidWorldException as e:
+        print(e)
+
+
+
+if __name__ == "__main__":
+    main()
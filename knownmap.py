@@ -0,0 +1,188 @@
+# What an agent knows about each cell, by its own relative (row, col)
+UNKNOWN = 0
+FREE = 1
+WALL = 2
+
+# Percept directions as (row, col) steps
+STEPS = {'N': (-1, 0), 'S': (1, 0), 'E': (0, 1), 'W': (0, -1)}
+
+# Percept flags of plain floor and of walls; every other flag is a cell
+# worth noting (goal, teleport or exit)
+FLOOR_FLAG = 'g'
+WALL_FLAG = 'w'
+
+
+def neighbors(cell):
+    row, col = cell
+    return ((row - 1, col), (row + 1, col), (row, col + 1), (row, col - 1))
+
+
+class KnownMap:
+    """
+    Occupancy grid of an agent's relative coordinates, one byte per cell.
+    The grid starts small around (0, 0) and doubles in the direction it
+    needs whenever a cell outside it is set. Every cell whose state
+    changes is appended to changes, for planners that repair their
+    searches.
+    """
+
+    def __init__(self, size=16):
+        self.top = -(size // 2)
+        self.left = -(size // 2)
+        self.rows = size
+        self.cols = size
+        self.cells = bytearray(size * size)
+        self.free_count = 0
+        self.changes = []
+
+    def index(self, cell):
+        row = cell[0] - self.top
+        col = cell[1] - self.left
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row * self.cols + col
+        return -1
+
+    def get(self, cell):
+        row = cell[0] - self.top
+        col = cell[1] - self.left
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return self.cells[row * self.cols + col]
+        return UNKNOWN
+
+    def is_free(self, cell):
+        # get() inlined, as planners call this for every neighbor they look at
+        row = cell[0] - self.top
+        col = cell[1] - self.left
+        return 0 <= row < self.rows and 0 <= col < self.cols and self.cells[row * self.cols + col] == FREE
+
+    def set(self, cell, state):
+        index = self.index(cell)
+        if index < 0:
+            self.grow(cell)
+            index = self.index(cell)
+        old = self.cells[index]
+        if old != state:
+            self.free_count += (state == FREE) - (old == FREE)
+            self.cells[index] = state
+            self.changes.append(cell)
+
+    def grow(self, cell):
+        top, left = self.top, self.left
+        bottom, right = top + self.rows, left + self.cols
+        while cell[0] < top:
+            top -= bottom - top
+        while cell[0] >= bottom:
+            bottom += bottom - top
+        while cell[1] < left:
+            left -= right - left
+        while cell[1] >= right:
+            right += right - left
+
+        rows, cols = bottom - top, right - left
+        cells = bytearray(rows * cols)
+        offset = (self.top - top) * cols + (self.left - left)
+        for row in range(self.rows):
+            start = offset + row * cols
+            cells[start:start + self.cols] = self.cells[row * self.cols:(row + 1) * self.cols]
+        self.top, self.left, self.rows, self.cols, self.cells = top, left, rows, cols, cells
+
+    def ingest(self, position, percepts):
+        """
+        Writes one turn of percepts into the map: the agent's cell and every
+        cell of the four rays, free up to the wall that ends each ray. A ray
+        that ends without a wall ran into the edge of the map, which blocks
+        like one. Returns the (cell, flag) pairs of the goals, teleports and
+        exits seen, the agent's own cell included.
+        """
+        marks = []
+        self.set(position, FREE)
+        flag = percepts['X'][0]
+        if flag != FLOOR_FLAG:
+            marks.append((position, flag))
+        for direction, (d_row, d_col) in STEPS.items():
+            if direction not in percepts:
+                continue
+            row, col = position
+            for flag in percepts[direction]:
+                row += d_row
+                col += d_col
+                state = WALL if flag == WALL_FLAG else FREE
+                # Most of a ray is known already; set() only for what is not
+                r, c = row - self.top, col - self.left
+                if not (0 <= r < self.rows and 0 <= c < self.cols and self.cells[r * self.cols + c] == state):
+                    self.set((row, col), state)
+                if state == WALL:
+                    break
+                if flag != FLOOR_FLAG:
+                    marks.append(((row, col), flag))
+            else:
+                self.set((row + d_row, col + d_col), WALL)
+        return marks
+
+    def mark_free(self, cells):
+        # Cells another agent found free; what this agent saw itself wins
+        for cell in cells:
+            if self.get(cell) == UNKNOWN:
+                self.set(cell, FREE)
+
+
+# Side of the square buckets of a FrontierIndex, in cells
+BUCKET_SIZE = 8
+# Up to this many targets a plain min() is cheaper than building buckets
+SCAN_TARGETS = 96
+
+
+class FrontierIndex:
+    """
+    Target cells grouped into square buckets, for the Manhattan distance
+    from a cell to the nearest target. Buckets are read in rings around the
+    cell's own bucket, and the search stops once no further ring can hold a
+    closer target. The result is the same as a min() over every target,
+    which is what small sets of targets get.
+    """
+
+    def __init__(self, cells, bucket_size=BUCKET_SIZE, scan_targets=SCAN_TARGETS):
+        self.size = bucket_size
+        self.cells = list(cells)
+        self.buckets = {}
+        if len(self.cells) <= scan_targets:
+            return
+        for cell in self.cells:
+            self.buckets.setdefault((cell[0] // bucket_size, cell[1] // bucket_size), []).append(cell)
+        if self.buckets:
+            self.top = min(b[0] for b in self.buckets)
+            self.bottom = max(b[0] for b in self.buckets)
+            self.left = min(b[1] for b in self.buckets)
+            self.right = max(b[1] for b in self.buckets)
+
+    def scan(self, cell):
+        return min(abs(cell[0] - target[0]) + abs(cell[1] - target[1]) for target in self.cells)
+
+    def distance(self, cell):
+        if not self.buckets:
+            # Few targets, or none: ValueError then, as min() over no targets
+            return self.scan(cell)
+        row, col = cell
+        b_row, b_col = row // self.size, col // self.size
+        last_ring = max(b_row - self.top, self.bottom - b_row, b_col - self.left, self.right - b_col)
+        best = None
+        for ring in range(last_ring + 1):
+            if 8 * ring > len(self.buckets):
+                # The ring has more buckets than there are targets
+                return self.scan(cell)
+            if ring == 0:
+                keys = [(b_row, b_col)]
+            else:
+                keys = [(b_row - ring, c) for c in range(b_col - ring, b_col + ring + 1)]
+                keys += [(b_row + ring, c) for c in range(b_col - ring, b_col + ring + 1)]
+                keys += [(r, b_col - ring) for r in range(b_row - ring + 1, b_row + ring)]
+                keys += [(r, b_col + ring) for r in range(b_row - ring + 1, b_row + ring)]
+            for key in keys:
+                for target in self.buckets.get(key, ()):
+                    d = abs(row - target[0]) + abs(col - target[1])
+                    if best is None or d < best:
+                        best = d
+            # Targets further out are at least ring * size + 1 away
+            if best is not None and best <= ring * self.size:
+                return best
+        return best
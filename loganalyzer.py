@@ -0,0 +1,379 @@
+import sys
+import os
+import struct
+from array import array
+
+import simtrace
+
+# Turn offset index, kept next to the log as <log>.idx: the magic and
+# version, the log's size and mtime when indexed, the number of turns,
+# then the byte offset of every turn header, turn 1 first.
+INDEX_MAGIC = b"MWI1"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<4sHQqI")
+
+TURN_PREFIX = b"-----Turn "
+AGENT_PREFIX = b"Agent "
+START_PREFIX = b"   Start:"
+PERCEPTS_PREFIX = b"   Percepts:"
+COMMAND_PREFIX = b"   Command:"
+TRIGGER_PREFIX = b"   Trigger:"
+END_PREFIX = b"   End:"
+FAILURE_SUFFIX = b"- FAILURE"
+
+NO_POSITION = -1
+
+
+def agent_index(name):
+    # Inverse of sim.agent_name
+    if len(name) == 1 and 'A' <= name <= 'Z':
+        return ord(name) - ord('A')
+    return int(name)
+
+
+def parse_position(text):
+    x, y = text.strip().split(",")
+    if x == "None":
+        return NO_POSITION, NO_POSITION
+    return int(x), int(y)
+
+
+def parse_trigger(text):
+    # The trigger name of simtrace.TRIGGERS and its detail
+    if " teleported from " in text:
+        return 'TELEPORT', text.rsplit(" to ", 1)[1]
+    if " activated goal " in text:
+        return 'GOAL_TRIGGERED', text.rsplit(" ", 1)[1]
+    if " has left the environment" in text:
+        return 'EXIT', None
+    return 'NONE', None
+
+
+def parse_percepts(text):
+    """
+    Percepts as logged by simlog.format_percepts, "(X ['g']) (N ['w', 'r'])",
+    back to a dict of lists.
+    """
+    percepts = {}
+    for part in text.strip().split(") ("):
+        part = part.strip("() ")
+        if not part:
+            continue
+        key, _, cells = part.partition(" ")
+        percepts[key] = [c.strip(" '") for c in cells.strip("[]").split(",") if c.strip(" '")]
+    return percepts
+
+
+class LogRecord:
+    """One agent's turn as read from a log."""
+
+    __slots__ = ['turn', 'agent', 'start_x', 'start_y', 'percepts', 'command', 'trigger', 'detail', 'end_x', 'end_y']
+
+    def __init__(self, turn, agent):
+        self.turn = turn
+        self.agent = agent
+        self.start_x = NO_POSITION
+        self.start_y = NO_POSITION
+        self.percepts = None
+        self.command = None
+        self.trigger = 'NONE'
+        self.detail = None
+        self.end_x = NO_POSITION
+        self.end_y = NO_POSITION
+
+
+def scan(f, offset=0):
+    """
+    Streams (turn offset or None, record or None) from a log opened in
+    binary mode: a turn's byte offset when its header is read, and each
+    agent's record once it is complete. offset is where f is positioned.
+    Percepts stay as text; parse_percepts() turns them into a dict.
+    """
+    turn = 0
+    record = None
+    for line in f:
+        line_offset = offset
+        offset += len(line)
+        if line.startswith(b"   "):
+            if record is None:
+                continue
+            if line.startswith(START_PREFIX):
+                record.start_x, record.start_y = parse_position(line[len(START_PREFIX):].decode("ascii"))
+            elif line.startswith(PERCEPTS_PREFIX):
+                record.percepts = line[len(PERCEPTS_PREFIX):].decode("ascii").strip()
+            elif line.startswith(COMMAND_PREFIX):
+                record.command = line[len(COMMAND_PREFIX):].decode("ascii").strip()
+            elif line.startswith(TRIGGER_PREFIX):
+                record.trigger, record.detail = parse_trigger(line[len(TRIGGER_PREFIX):].decode("ascii").strip())
+            elif line.startswith(END_PREFIX):
+                record.end_x, record.end_y = parse_position(line[len(END_PREFIX):].decode("ascii"))
+                yield None, record
+                record = None
+        elif line.startswith(TURN_PREFIX):
+            turn = int(line[len(TURN_PREFIX):].strip(b"-\r\n"))
+            yield line_offset, None
+        elif line.startswith(AGENT_PREFIX):
+            words = line.split()
+            if len(words) == 2:
+                record = LogRecord(turn, agent_index(words[1].decode("ascii")))
+            elif record is not None and line.rstrip().endswith(FAILURE_SUFFIX):
+                # An invalid command ends the agent's turn where it started
+                record.trigger = 'INVALID'
+                record.end_x, record.end_y = record.start_x, record.start_y
+                yield None, record
+                record = None
+
+
+class LogColumns:
+    """
+    A log's records as parallel arrays, one entry per agent turn, with
+    commands and triggers as simtrace codes. Percepts are kept as text
+    when keep_percepts is set.
+    """
+
+    def __init__(self, keep_percepts=False):
+        self.keep_percepts = keep_percepts
+        self.turn = array('I')
+        self.agent = array('H')
+        self.start_x = array('i')
+        self.start_y = array('i')
+        self.end_x = array('i')
+        self.end_y = array('i')
+        self.command = array('B')
+        self.trigger = array('B')
+        self.percepts = []
+
+    def __len__(self):
+        return len(self.turn)
+
+    def add(self, record):
+        self.turn.append(record.turn)
+        self.agent.append(record.agent)
+        self.start_x.append(record.start_x)
+        self.start_y.append(record.start_y)
+        self.end_x.append(record.end_x)
+        self.end_y.append(record.end_y)
+        if record.command in simtrace.COMMANDS:
+            self.command.append(simtrace.COMMANDS.index(record.command))
+        else:
+            self.command.append(simtrace.INVALID_COMMAND)
+        self.trigger.append(simtrace.TRIGGERS.index(record.trigger))
+        if self.keep_percepts:
+            self.percepts.append(record.percepts)
+
+
+class LogStats:
+    """
+    Per-agent aggregates gathered in one pass: turns played, how often an
+    agent ended its turn on a cell it had already been on, teleports,
+    goals with the turn they were taken, the first turn the exit was in
+    sight, the turn it left and invalid commands.
+    """
+
+    def __init__(self):
+        self.agents = {}
+
+    def agent(self, index):
+        if index not in self.agents:
+            self.agents[index] = {
+                'turns': 0,
+                'revisits': 0,
+                'cells': set(),
+                'teleports': 0,
+                'goals': [],
+                'exit_seen': None,
+                'exited': None,
+                'invalid': 0,
+            }
+        return self.agents[index]
+
+    def add(self, record):
+        stats = self.agent(record.agent)
+        stats['turns'] += 1
+        if not stats['cells']:
+            stats['cells'].add((record.start_x, record.start_y))
+        if record.end_x != NO_POSITION:
+            cell = (record.end_x, record.end_y)
+            if cell in stats['cells']:
+                stats['revisits'] += 1
+            else:
+                stats['cells'].add(cell)
+        if stats['exit_seen'] is None and record.percepts is not None and "'r'" in record.percepts:
+            stats['exit_seen'] = record.turn
+        match record.trigger:
+            case 'TELEPORT':
+                stats['teleports'] += 1
+            case 'GOAL_TRIGGERED':
+                stats['goals'].append((record.turn, record.detail))
+            case 'EXIT':
+                stats['exited'] = record.turn
+            case 'INVALID':
+                stats['invalid'] += 1
+
+    def merge(self, other):
+        # Adds another log's stats, as for a set of logs of the same agents
+        for index, theirs in other.agents.items():
+            mine = self.agent(index)
+            for key in ['turns', 'revisits', 'teleports', 'invalid']:
+                mine[key] += theirs[key]
+            mine['goals'] += theirs['goals']
+            mine['cells'] |= theirs['cells']
+            for key in ['exit_seen', 'exited']:
+                if mine[key] is None or (theirs[key] is not None and theirs[key] < mine[key]):
+                    mine[key] = theirs[key]
+
+    def revisit_rate(self, index):
+        stats = self.agents[index]
+        return stats['revisits'] / stats['turns'] if stats['turns'] else 0.0
+
+
+def analyze(filename, columns=None, stats=None):
+    """
+    Reads a log once, feeding every record to columns and stats (a
+    LogColumns and a LogStats, either may be None). Returns the byte
+    offsets of the turn headers.
+    """
+    offsets = array('Q')
+    with open(filename, 'rb') as f:
+        for offset, record in scan(f):
+            if record is None:
+                offsets.append(offset)
+                continue
+            if columns is not None:
+                columns.add(record)
+            if stats is not None:
+                stats.add(record)
+    return offsets
+
+
+def index_filename(filename):
+    return filename + ".idx"
+
+
+def write_index(filename, offsets):
+    info = os.stat(filename)
+    with open(index_filename(filename), 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, info.st_size, info.st_mtime_ns, len(offsets)))
+        f.write(offsets.tobytes())
+
+
+def read_index(filename):
+    # The saved offsets, or None if there is no index or the log changed
+    try:
+        with open(index_filename(filename), 'rb') as f:
+            header = f.read(INDEX_HEADER.size)
+            if len(header) < INDEX_HEADER.size:
+                return None
+            magic, version, size, mtime, count = INDEX_HEADER.unpack(header)
+            info = os.stat(filename)
+            if magic != INDEX_MAGIC or version != INDEX_VERSION or size != info.st_size or mtime != info.st_mtime_ns:
+                return None
+            offsets = array('Q')
+            offsets.frombytes(f.read(count * offsets.itemsize))
+            return offsets
+    except OSError:
+        return None
+
+
+def load_index(filename):
+    # The turn offsets of a log, building and saving the index if needed
+    offsets = read_index(filename)
+    if offsets is None:
+        offsets = analyze(filename)
+        write_index(filename, offsets)
+    return offsets
+
+
+def read_turn(filename, turn, offsets=None):
+    # The records of one turn, reading only that turn's lines
+    if offsets is None:
+        offsets = load_index(filename)
+    if not 1 <= turn <= len(offsets):
+        return []
+    records = []
+    with open(filename, 'rb') as f:
+        f.seek(offsets[turn - 1])
+        for offset, record in scan(f, offsets[turn - 1]):
+            if record is None:
+                if records or offset != offsets[turn - 1]:
+                    break
+                continue
+            records.append(record)
+    return records
+
+
+def print_stats(stats):
+    print(f"{'agent':<7}{'turns':>8}{'revisit %':>11}{'teleports':>11}{'goals':>7}{'exit seen':>11}{'exited':>8}{'invalid':>9}")
+    for index in sorted(stats.agents):
+        s = stats.agents[index]
+        print(
+            f"{index:<7}{s['turns']:>8}{100 * stats.revisit_rate(index):>11.1f}{s['teleports']:>11}"
+            f"{len(s['goals']):>7}{str(s['exit_seen']):>11}{str(s['exited']):>8}{s['invalid']:>9}"
+        )
+
+
+def main():
+
+    log_filenames = []
+    turn = None
+    write_indexes = False
+
+    args = sys.argv
+
+    if "-h" in args or len(args) == 1:
+        print("Analyze simulation text logs.")
+        print("Usage: python loganalyzer.py -l <log> [-l <log> ...] [-t <turn>] [-i]")
+        print("       -t prints one turn of each log through its index, -i writes the indexes")
+        return
+
+    i = 1
+    while i < len(args):
+        try:
+            if args[i] == "-l":
+                log_filenames.append(args[i+1])
+            elif args[i] == "-t":
+                turn = int(args[i+1])
+            elif args[i] == "-i":
+                write_indexes = True
+        except (IndexError, ValueError):
+            print("Incorrect command line arguments. Run with -h for help.")
+            return
+
+        i+=1
+
+    if not log_filenames:
+        print("At least one -l is required. Run with -h for help.")
+        return
+
+    try:
+        if turn is not None:
+            for filename in log_filenames:
+                print(f"{filename}, turn {turn}")
+                for record in read_turn(filename, turn):
+                    end = "left" if record.end_x == NO_POSITION else f"{record.end_x},{record.end_y}"
+                    print(
+                        f"  Agent {record.agent}: {record.start_x},{record.start_y} {record.command} -> {end}"
+                        f"  {record.trigger if record.detail is None else record.trigger + ' ' + record.detail}"
+                    )
+            return
+
+        total = LogStats()
+        for filename in log_filenames:
+            stats = LogStats()
+            offsets = analyze(filename, stats=stats)
+            if write_indexes:
+                write_index(filename, offsets)
+            total.merge(stats)
+            if len(log_filenames) > 1:
+                print(f"{filename}: {len(offsets)} turns")
+                print_stats(stats)
+        if len(log_filenames) > 1:
+            print("All logs")
+        print_stats(total)
+    except OSError as e:
+        print(e)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,12 @@ import sys
 import world
 import misc
 import sim
+import simlog
+import simtrace
+import agentrunner
+import replay
+import timing
+import checkpoint
 
 def main():
 
@@ -12,10 +18,29 @@ def main():
     the_world = None
     use_display = False
     display_speed = 0.5
+    compact = True  # CompactWorld, the backend with wall-distance tables and fork/snapshot/reset
+    log_level = simlog.PERCEPTS
+    trace_filename = None
+    trace = None
+    per_turn = None
+    total = None
+    policy = 'bad'
+    processes = False
+    simultaneous = False
+    budget = None
+    seed = None
+    record_filename = None
+    recorder = None
+    the_timing = None
+    timing_filename = None
+    checkpoint_filename = None
+    checkpoint_every = 100
+    checkpointer = None
+    resume_filename = None
 
     args = sys.argv
 
-    if "-w" not in args:
+    if "-w" not in args and "-resume" not in args:
         print("Map argument missing. Run with -h for help.")
 
     if "-h" in args:
@@ -34,6 +59,45 @@ def main():
                     display_speed = float(args[i+1])
                 except:
                     pass
+            elif args[i] == "-v":
+                if args[i+1] not in simlog.LEVELS:
+                    print(f"log level must be one of: {', '.join(simlog.LEVELS)}")
+                    return
+                log_level = simlog.LEVELS[args[i+1]]
+            elif args[i] == "-r":
+                trace_filename = args[i+1]
+            elif args[i] == "-c":
+                compact = True
+            elif args[i] == "-nc":
+                compact = False
+            elif args[i] == "-b":
+                per_turn = float(args[i+1])
+            elif args[i] == "-bt":
+                total = float(args[i+1])
+            elif args[i] == "-bp":
+                if args[i+1] not in agentrunner.BUDGET_POLICIES:
+                    print(f"budget policy must be one of: {', '.join(agentrunner.BUDGET_POLICIES)}")
+                    return
+                policy = args[i+1]
+            elif args[i] == "-p":
+                processes = True
+            elif args[i] == "-s":
+                simultaneous = True
+            elif args[i] == "-seed":
+                seed = int(args[i+1])
+            elif args[i] == "-rec":
+                record_filename = args[i+1]
+            elif args[i] == "-ckpt":
+                checkpoint_filename = args[i+1]
+            elif args[i] == "-ckpte":
+                checkpoint_every = int(args[i+1])
+            elif args[i] == "-resume":
+                resume_filename = args[i+1]
+            elif args[i] == "-prof":
+                the_timing = timing.Timing()
+            elif args[i] == "-profo":
+                the_timing = timing.Timing()
+                timing_filename = args[i+1]
             elif args[i] == "-t":
                 try:
                     max_turns = int(args[i+1])
@@ -47,16 +111,39 @@ def main():
 
     if log_filename is not None:
         log = open(log_filename, 'w')
+    the_log = simlog.SimLog(log, log_level)
+    if trace_filename is not None:
+        trace = simtrace.open_trace(trace_filename)
+    if per_turn is not None or total is not None or processes:
+        budget = agentrunner.TimeBudget(per_turn, total, policy, processes)
+    if record_filename is not None:
+        recorder = replay.Recorder(record_filename)
+    if checkpoint_filename is not None:
+        checkpointer = checkpoint.Checkpointer(checkpoint_filename, checkpoint_every)
         
     try:
-        the_world = world.World(world_filename)
-        the_world.load_world()
-        sim.run_sim(the_world, max_turns, log, use_display, display_speed)
-    except misc.InvalidCellException as e:
+        if resume_filename is not None:
+            checkpoint.resume(resume_filename, the_log, use_display=use_display, display_speed=display_speed,
+                trace=trace, timing=the_timing, checkpointer=checkpointer)
+        else:
+            the_world = world.make_world(world_filename, compact)
+            the_world.load_world()
+            sim.run_sim(the_world, max_turns, the_log, use_display, display_speed, trace, budget=budget,
+                simultaneous=simultaneous, seed=seed, recorder=recorder,
+                timing=the_timing, checkpointer=checkpointer)
+        if timing_filename is not None:
+            the_timing.write_csv(timing_filename)
+        elif the_timing is not None:
+            the_timing.print_summary()
+    except (misc.InvalidCellException, ValueError) as e:
         print(e)
     finally:
         if log is not None:
             log.close()
+        if trace is not None:
+            trace.close()
+        if recorder is not None:
+            recorder.close()
 
 
 
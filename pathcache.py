@@ -0,0 +1,82 @@
+# Why a committed path was dropped, as counted in PathCache.invalidations
+INVALIDATION_REASONS = ['planner', 'position', 'target', 'wall', 'teleport', 'spotted', 'message']
+
+
+class PathCache:
+    """
+    The path an agent committed to, as (direction, cell) steps from a
+    planner's path(). The agent steps along it and plans again only when
+    something invalidates it: another planner asked for, the agent not
+    where the path says, the target gone from the targets, a wall seen on
+    a cell still ahead, or one of the agent's own events passed to
+    invalidate(). hits counts steps taken from the cache, replans the
+    paths planned.
+    """
+
+    def __init__(self, known):
+        self.known = known
+        self.planner = None
+        self.steps = []
+        self.next = 0
+        self.cells = set()
+        self.position = None
+        self.synced = 0
+        self.hits = 0
+        self.replans = 0
+        self.invalidations = dict.fromkeys(INVALIDATION_REASONS, 0)
+
+    def invalidate(self, reason):
+        if self.next < len(self.steps):
+            self.invalidations[reason] += 1
+        self.steps = []
+        self.next = 0
+        self.cells = set()
+
+    def valid(self, planner, position, targets):
+        if self.next >= len(self.steps):
+            return False
+        if planner is not self.planner:
+            self.invalidate('planner')
+        elif position != self.position:
+            self.invalidate('position')
+        elif self.steps[-1][1] not in targets:
+            self.invalidate('target')
+        else:
+            changes = self.known.changes
+            for cell in changes[self.synced:]:
+                if cell in self.cells and not self.known.is_free(cell):
+                    self.invalidate('wall')
+                    break
+            self.synced = len(changes)
+        return self.next < len(self.steps)
+
+    def take(self):
+        direction, cell = self.steps[self.next]
+        self.next += 1
+        self.cells.discard(cell)
+        self.position = cell
+        return direction
+
+    def next_move(self, planner, position, targets):
+        """
+        The next step toward the nearest target: along the committed path
+        if it still holds, otherwise along a new path from the planner.
+        None if no target can be reached.
+        """
+        if self.valid(planner, position, targets):
+            self.hits += 1
+            return self.take()
+
+        steps = planner.path(position, targets)
+        self.replans += 1
+        if steps is None:
+            return None
+        if not steps:
+            return 'N'  # As the planner's next_move when the agent is on a target
+        self.planner = planner
+        self.steps = steps
+        self.next = 0
+        self.cells = {cell for _, cell in steps}
+        self.position = position
+        self.synced = len(self.known.changes)
+        return self.take()
@@ -0,0 +1,234 @@
+import sys
+import struct
+import zlib
+
+import world
+import misc
+import sim
+import simlog
+import simtrace
+
+# Episode recording: a header, the world file name, then one command code
+# per agent per turn, in the order run_sim applies them, zlib compressed.
+# Codes are indices in simtrace.COMMANDS, INVALID_COMMAND for anything else.
+RECORD_MAGIC = b"MWR1"
+RECORD_VERSION = 1
+RECORD_HEADER = struct.Struct("<4sHqHIH")
+SEED_RANGE = range(-2**63, 2**63)
+NO_MAX_TURNS = 0
+
+
+class Recorder:
+    """
+    Records an episode's seed and command stream for Replay. run_sim calls
+    begin() once and record() for every command it applies.
+    """
+
+    def __init__(self, filename, buffer_size=1 << 16):
+        self.f = open(filename, 'wb')
+        self.compressor = zlib.compressobj(9)
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+
+    def begin(self, world_filename, seed, agents, max_turns):
+        if seed not in SEED_RANGE:
+            raise ValueError(f"Seed {seed} does not fit in a recording; use a 64-bit signed integer.")
+        name = (world_filename or "").encode("utf-8")
+        self.f.write(RECORD_HEADER.pack(
+            RECORD_MAGIC,
+            RECORD_VERSION,
+            seed,
+            agents,
+            max_turns if max_turns is not None else NO_MAX_TURNS,
+            len(name)
+        ))
+        self.f.write(name)
+
+    def record(self, cmd):
+        self.buffer.append(simtrace.COMMANDS.index(cmd) if cmd in simtrace.COMMANDS else simtrace.INVALID_COMMAND)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.f.write(self.compressor.compress(self.buffer))
+        self.buffer = bytearray()
+
+    def close(self):
+        self.flush()
+        self.f.write(self.compressor.flush())
+        self.f.close()
+
+
+def read_recording(filename):
+    # Returns the header fields and the command codes
+    with open(filename, 'rb') as f:
+        header = f.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size or header[:len(RECORD_MAGIC)] != RECORD_MAGIC:
+            raise ValueError(f"{filename} is not an episode recording.")
+        magic, version, seed, agents, max_turns, name_size = RECORD_HEADER.unpack(header)
+        if version != RECORD_VERSION:
+            raise ValueError(f"Recording {filename} has unsupported version {version}.")
+        world_filename = f.read(name_size).decode("utf-8")
+        commands = zlib.decompress(f.read())
+    if max_turns == NO_MAX_TURNS:
+        max_turns = None
+    return world_filename, seed, agents, max_turns, commands
+
+
+class Checkpoint:
+    __slots__ = ['turn', 'position', 'world', 'agents']
+
+    def __init__(self, turn, position, the_world, agents):
+        self.turn = turn
+        self.position = position
+        self.world = the_world.snapshot()
+        self.agents = [
+            (agent.x, agent.y, agent.facing, agent.state, agent.points, agent.cmd)
+            for agent in agents
+        ]
+
+
+class Replay:
+    """
+    Rebuilds a recorded episode from its commands alone, without running
+    the AIs. Loading plays the whole episode once and keeps a checkpoint
+    every checkpoint_every turns, so seek() reaches any turn by replaying
+    at most that many turns.
+    """
+
+    def __init__(self, filename, world_filename=None, checkpoint_every=100):
+        recorded_world, self.seed, self.agent_count, self.max_turns, self.commands = read_recording(filename)
+        self.world_filename = world_filename or recorded_world
+        self.checkpoint_every = checkpoint_every
+        self.log = simlog.SimLog(level=simlog.OFF)
+        self.points_per_goal = self.max_turns if self.max_turns is not None else 0
+
+        self.start_world = world.make_world(self.world_filename, compact=True)
+        self.start_world.load_world()
+        if not self.start_world.cells:
+            raise misc.InvalidWorldException(f"World {self.world_filename} could not be loaded.")
+        self.start_world.make_pristine()
+
+        self.checkpoints = []
+        self.world = self.start_world.fork()
+        self.agents = [
+            sim.Agent(sim.agent_name(i), i, None, *sim.start_state(self.world, i))
+            for i in range(self.agent_count)
+        ]
+        self.turn = 0
+        self.position = 0
+        while self.step(checkpoint=True):
+            pass
+        self.turns = self.turn
+
+    def finished(self):
+        if all(agent.state != 'GOOD' for agent in self.agents):
+            return True
+        return self.max_turns is not None and self.turn >= self.max_turns
+
+    def step(self, checkpoint=False):
+        # Plays one turn; False once the episode is over
+        if checkpoint and self.turn % self.checkpoint_every == 0:
+            self.checkpoints.append(Checkpoint(self.turn, self.position, self.world, self.agents))
+        if self.finished():
+            return False
+        if self.position >= len(self.commands):
+            raise ValueError(f"Recording ends early, at turn {self.turn}.")
+        self.turn += 1
+        for agent in self.agents:
+            if agent.state != 'GOOD':
+                continue
+            agent.points += 1
+            code = self.commands[self.position]
+            self.position += 1
+            agent.cmd = simtrace.COMMANDS[code] if code < len(simtrace.COMMANDS) else None
+            sim.apply_command(self.world, agent, self.points_per_goal, self.log)
+        return True
+
+    def seek(self, turn):
+        """
+        Puts the world and agents in their state at the end of turn (0 is
+        the start), clamped to the episode's length.
+        """
+        turn = max(0, min(turn, self.turns))
+        checkpoint = self.checkpoints[turn // self.checkpoint_every]
+        self.world = checkpoint.world.snapshot()
+        for agent, (x, y, facing, state, points, cmd) in zip(self.agents, checkpoint.agents):
+            agent.x = x
+            agent.y = y
+            agent.facing = facing
+            agent.state = state
+            agent.points = points
+            agent.cmd = cmd
+        self.turn = checkpoint.turn
+        self.position = checkpoint.position
+        while self.turn < turn:
+            self.step()
+
+    def results(self):
+        # The state reached so far, in the shape of run_sim's results
+        scores = [agent.points if agent.state == 'EXITED' else 0 for agent in self.agents]
+        return {
+            'turns': self.turn,
+            'points': [agent.points for agent in self.agents],
+            'scores': scores,
+            'states': [agent.state for agent in self.agents],
+            'total': sum(scores),
+        }
+
+
+def main():
+
+    filename = None
+    world_filename = None
+    turn = None
+
+    args = sys.argv
+
+    if "-h" in args or len(args) == 1:
+        print("Replay a recorded episode without running the AIs.")
+        print("Usage: python replay.py -r <recording> [-w <world>] [-t <turn>]")
+        return
+
+    i = 1
+    while i < len(args):
+        try:
+            if args[i] == "-r":
+                filename = args[i+1]
+            elif args[i] == "-w":
+                world_filename = args[i+1]
+            elif args[i] == "-t":
+                turn = int(args[i+1])
+        except (IndexError, ValueError):
+            print("Incorrect command line arguments. Run with -h for help.")
+            return
+
+        i+=1
+
+    if filename is None:
+        print("A recording is required. Run with -h for help.")
+        return
+
+    try:
+        the_replay = Replay(filename, world_filename)
+    except (ValueError, misc.InvalidCellException, misc.InvalidWorldException) as e:
+        print(e)
+        return
+
+    print(f"World: {the_replay.world_filename}  seed: {the_replay.seed}  turns: {the_replay.turns}")
+    if turn is not None:
+        the_replay.seek(turn)
+        print(f"Turn {the_replay.turn}")
+        for agent in the_replay.agents:
+            print(f"Agent {agent.name} {agent.state} at {agent.x},{agent.y} with {agent.points} points")
+        the_replay.world.prettyprint_world()
+    else:
+        result = the_replay.results()
+        for agent, score in zip(the_replay.agents, result['scores']):
+            print(f"Agent {agent.name} {agent.state} received {agent.points} points and scored {score} points.")
+        print(f"TOTAL: {result['total']}")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,11 @@ import world
 import aiA
 import aiB
 import display
+import simlog
+import simtrace
+import agentrunner
 import time
+import random
 
 DIRECTIONS = {
     "N": (0, -1),
@@ -21,37 +25,196 @@ VALID_COMMANDS = [
 ]
 
 
+class Agent:
+    """The simulator's state for one agent, with its AI object."""
+
+    __slots__ = ['name', 'index', 'ai', 'x', 'y', 'facing', 'state', 'points', 'cmd', 'msg', 'times']
+
+    def __init__(self, name, index, ai, x, y, facing):
+        self.name = name
+        self.index = index
+        self.ai = ai
+        self.x = x
+        self.y = y
+        self.facing = facing
+        self.state = 'GOOD'
+        self.points = 0
+        self.cmd = "X"
+        self.msg = None
+        self.times = []
+
+
+def agent_name(index):
+    # A, B, ... Z, then numbers
+    return chr(ord('A') + index) if index < 26 else str(index)
+
+
+def start_state(the_world, index):
+    # Agents alternate between the world's A and B starting cells
+    if index % 2 == 0:
+        x, y = the_world.get_startxyA()
+        return x, y, the_world.get_start_face_dirA()
+    x, y = the_world.get_startxyB()
+    return x, y, the_world.get_start_face_dirB()
+
+
+def make_agents(the_world, ai_modules, max_turns):
+    return [
+        Agent(agent_name(i), i, module.AI(max_turns), *start_state(the_world, i))
+        for i, module in enumerate(ai_modules)
+    ]
+
+
+def apply_command(the_world, agent, points_per_goal, log):
+    """
+    Moves the agent by its command and fires any trigger. Returns the
+    trigger name, or "INVALID" if the command was not valid.
+    """
+    if not validate_agent_cmd(agent.cmd):
+        log.write(simlog.TURNS, "Agent {} invalid command: {}", agent.name, agent.cmd)
+        log.write(simlog.TURNS, "Agent {} - FAILURE", agent.name)
+        agent.state = 'BAD'
+        return "INVALID"
+
+    match agent.cmd:
+        case 'N' | 'E' | 'S' | 'W':
+            dx, dy = DIRECTIONS[agent.cmd]
+            if the_world.is_cell_enterable(agent.x + dx, agent.y + dy):
+                agent.x += dx
+                agent.y += dy
+
+    trigger = the_world.check_triggers(agent.x, agent.y, agent.cmd)
+    match trigger[0]:
+        case "EXIT":
+            log.write(simlog.TURNS, "   Trigger:  Agent {} has left the environment.", agent.name)
+            agent.state = 'EXITED'
+            agent.x = None
+            agent.y = None
+            agent.facing = None
+        case "TELEPORT":
+            log.write(
+                simlog.TURNS,
+                "   Trigger:  Agent {} teleported from {} to {}",
+                agent.name,
+                the_world.get_cell(agent.x, agent.y),
+                the_world.get_cell(trigger[1], trigger[2])
+            )
+            agent.x = trigger[1]
+            agent.y = trigger[2]
+        case "GOAL_TRIGGERED":
+            agent.points += points_per_goal
+            log.write(simlog.TURNS, "   Trigger:  Agent {} activated goal {}", agent.name, trigger[2])
+        case "NONE":
+            pass
+
+    log.write(simlog.TURNS, "   End:      {},{}", agent.x, agent.y)
+    return trigger[0]
+
+
+def decide(agent, percepts, msg, budget, log):
+    """
+    Sets the agent's command and message from its AI, within the budget if
+    there is one, and records how long the update call took.
+    """
+    if budget is None:
+        start = time.perf_counter()
+        agent.cmd, agent.msg = agent.ai.update(percepts, msg)
+        agent.times.append(time.perf_counter() - start)
+        return
+
+    budget.start(agent, percepts, msg)
+    finish_decision(agent, budget, log)
+
+
+def finish_decision(agent, budget, log):
+    agent.cmd, agent.msg, status = budget.finish(agent)
+    match status:
+        case 'OVERRUN':
+            log.write(simlog.TURNS, "Agent {} overran its turn budget", agent.name)
+        case 'OUT_OF_TIME':
+            log.write(simlog.TURNS, "Agent {} ran out of time", agent.name)
+        case 'ERROR':
+            log.write(simlog.TURNS, "Agent {} update failed", agent.name)
+
+
+def update_display(disp, agents):
+    # The display draws agents A and B only
+    a = agents[0]
+    b = agents[1] if len(agents) > 1 else Agent('B', 1, None, None, None, None)
+    disp.update(a.x, a.y, a.facing, b.x, b.y, b.facing)
+
+
 def run_sim(
     the_world, 
     max_turns=None, 
     log=None, 
     use_display=False,
-    display_speed=0.5
+    display_speed=0.5,
+    trace=None,
+    ai_modules=None,
+    budget=None,
+    simultaneous=False,
+    seed=None,
+    recorder=None,
+    timing=None,
+    checkpointer=None,
+    resume=None
 ):
+    """
+    Runs one scenario with one agent per module in ai_modules (aiA and aiB
+    by default). Agents act in order each turn, and each one receives the
+    latest message of the agent before it, so with two agents B sees A's
+    message from the same turn and A sees B's from the turn before.
+
+    With a budget (an agentrunner.TimeBudget), update calls run on worker
+    threads under its time limits; an agent that overruns fails or repeats
+    its last command, as the budget's policy says.
+
+    In simultaneous mode every agent decides from the world as it was at
+    the start of the turn, with the messages of the turn before, and all
+    update calls run at once (on processes if the budget has processes).
+    The moves are then applied in agent order.
+
+    With a seed the random module is seeded with it first. A recorder (a
+    replay.Recorder) gets the seed and every command applied, so that
+    replay.Replay can rebuild the episode; recording without a seed picks
+    one at random.
+
+    A timing (a timing.Timing) gets the time spent in each phase of every
+    agent's turn; without one the loop does no timing at all.
+
+    A checkpointer (a checkpoint.Checkpointer) saves the run between turns
+    now and then, which needs a run without a budget and without
+    simultaneous moves. resume is a checkpoint.Checkpoint to continue from
+    instead of starting afresh; the_world must be freshly loaded.
+    """
 
     POINTS_PER_GOAL = 0
     if max_turns is not None:
         POINTS_PER_GOAL = max_turns
-    
-    the_aiA = aiA.AI(max_turns)
-    the_aiB = aiB.AI(max_turns)
-
-    agent_xA, agent_yA = the_world.get_startxyA()
-    agent_xB, agent_yB = the_world.get_startxyB()
-    agent_facingA = the_world.get_start_face_dirA()
-    agent_facingB = the_world.get_start_face_dirB()
-    cells_visited = []
-    turn = 1
-    agent_cmdA = "X"
-    agent_cmdB = "X"
-    msgA = None
-    msgB = None
-    perceptsA = {}
-    perceptsB = {}
-    pointsA = 0
-    pointsB = 0
-    aiA_state = 'GOOD'
-    aiB_state = 'GOOD'
+
+    log = simlog.as_log(log)
+    if resume is not None and recorder is not None:
+        raise ValueError("A resumed run cannot be recorded.")
+    if simultaneous and budget is None:
+        budget = agentrunner.TimeBudget()
+    if checkpointer is not None and budget is not None:
+        raise ValueError("A run with a time budget or simultaneous moves cannot be checkpointed.")
+
+    if resume is not None:
+        agents, turn = resume.restore(the_world)
+    else:
+        if recorder is not None and seed is None:
+            seed = random.randrange(2**63)
+        if seed is not None:
+            random.seed(seed)
+
+        if ai_modules is None:
+            ai_modules = [aiA, aiB]
+        agents = make_agents(the_world, ai_modules, max_turns)
+        if recorder is not None:
+            recorder.begin(the_world.world_filename, seed, len(agents), max_turns)
+        turn = 1
 
     disp = None
 
@@ -59,299 +222,160 @@ def run_sim(
         import display
         disp = display.Display(
             the_world,
-            agent_xA,
-            agent_yA,
-            agent_xB,
-            agent_yB
-        )
-
-    if use_display:
-        disp.update(
-            agent_xA,
-            agent_yA,
-            agent_facingA,
-            agent_xB,
-            agent_yB,
-            agent_facingB
+            agents[0].x,
+            agents[0].y,
+            agents[1].x if len(agents) > 1 else None,
+            agents[1].y if len(agents) > 1 else None
         )
+        update_display(disp, agents)
         time.sleep(display_speed)
 
-    
-
-    run = True
-    while run:
-
-        
-        if aiA_state != 'GOOD' and aiB_state != 'GOOD':
-            run = False
-            write_to_log(
-                log,
-                f"-----Scenario finished-----"
-            )
-            write_to_log(
-                log,
-                f"FINAL AGENT STATES:\nAgent A {aiA_state}\nAgent B {aiB_state}"
-            )
-            continue
-        else:
-            write_to_log(
-                log,
-                f"-----Turn {turn}-----"
-            )
-        
-        if aiA_state == 'GOOD':
-            pointsA += 1
-            
-            # What does the agent see?
-            perceptsA = get_percepts(the_world, agent_xA, agent_yA, agent_facingA)
-            
-            # Get agent's command
-            agent_cmdA, msgA = the_aiA.update(perceptsA, msgB)
-            
-            # LOG ###############################################################
-            
-            write_to_log(
-                log,
-                f"Agent A"
-            )
-            write_to_log(
-                log,
-                f"   Start:    {agent_xA},{agent_yA}"
-            )
-            percept_str = ""
-            for k, v in perceptsA.items():
-                percept_str += f"({k} {v}) "
-            write_to_log(
-                log,
-                f"   Percepts: {percept_str}"
-            )
-            write_to_log(
-                log,
-                f"   Command:  {agent_cmdA}"
-            )
-
-            # ####################################################################
-
-            # Move the agent
-            if validate_agent_cmd(agent_cmdA):
-
-                new_agent_x = agent_xA
-                new_agent_y = agent_yA
-
-                match agent_cmdA:
-                    case 'N' | 'E' | 'S' | 'W':
-                        dx, dy = DIRECTIONS[agent_cmdA]
-                        new_agent_x = agent_xA + dx
-                        new_agent_y = agent_yA + dy
-                        if the_world.is_cell_enterable(new_agent_x, new_agent_y):
-                            agent_xA = new_agent_x
-                            agent_yA = new_agent_y
-
-
-                trigger = the_world.check_triggers(agent_xA, agent_yA, agent_cmdA)
-                match trigger[0]:
-                    case "EXIT":
-                        write_to_log(
-                            log,
-                            f"   Trigger:  Agent A has left the environment."
-                        )
-                        aiA_state = 'EXITED'
-                        agent_xA = None
-                        agent_yA = None
-                        agent_facingA = None
-                    case "TELEPORT":
-                        write_to_log(
-                            log,
-                            f"   Trigger:  Agent A teleported from {the_world.get_cell(agent_xA, agent_yA)} to {the_world.get_cell(trigger[1], trigger[2])}"
-                        )
-                        agent_xA = trigger[1]
-                        agent_yA = trigger[2]
-
-                    case "GOAL_TRIGGERED":
-                        # if trigger[1] == 0:
-                        #     write_to_log(
-                        #         log,
-                        #         f"   Trigger:  Agent A activated goal {trigger[2]}"
-                        #     )
-                        #     write_to_log(
-                        #         log,
-                        #         f"   Trigger:  Your team has completed this map in {turn} turns. SUCCESS"
-                        #     )
-                        #     run = False
-                        # else:
-                        pointsA += POINTS_PER_GOAL
-                        write_to_log(
-                            log,
-                            f"   Trigger:  Agent A activated goal {trigger[2]}"
-                        )
-                    case "NONE":
-                        pass
-
-
-                write_to_log(
-                    log,
-                    f"   End:      {agent_xA},{agent_yA}"
-                )
-
-            else:
-                write_to_log(log, f"Agent A invalid command: {agent_cmdA}")
-                write_to_log(log, "Agent A - FAILURE")
-                aiA_state = 'BAD'
-
-        if aiB_state == 'GOOD':
-            pointsB += 1
-            
-            # What does the agent see?
-            perceptsB = get_percepts(the_world, agent_xB, agent_yB, agent_facingB)
+    if timing is not None:
+        timing.begin()
 
-            # Get agent's command
-            agent_cmdB, msgB = the_aiB.update(perceptsB, msgA)
+    try:
+        while True:
 
-            # LOG ###############################################################
-            write_to_log(
-                log,
-                f"Agent B"
-            )
-            write_to_log(
-                log,
-                f"   Start:    {agent_xB},{agent_yB}"
-            )
-            percept_str = ""
-            for k, v in perceptsB.items():
-                percept_str += f"({k} {v}) "
-            write_to_log(
-                log,
-                f"   Percepts: {percept_str}"
-            )
-            write_to_log(
-                log,
-                f"   Command:  {agent_cmdB}"
-            )
-
-            # ####################################################################
-
-            # Move the agent
-            if validate_agent_cmd(agent_cmdB):
-
-                new_agent_x = agent_xB
-                new_agent_y = agent_yB
-
-                match agent_cmdB:
-                    case 'N' | 'E' | 'S' | 'W':
-                        dx, dy = DIRECTIONS[agent_cmdB]
-                        new_agent_x = agent_xB + dx
-                        new_agent_y = agent_yB + dy
-                        if the_world.is_cell_enterable(new_agent_x, new_agent_y):
-                            agent_xB = new_agent_x
-                            agent_yB = new_agent_y
-
-
-                trigger = the_world.check_triggers(agent_xB, agent_yB, agent_cmdB)
-                match trigger[0]:
-                    case "EXIT":
-                        write_to_log(
-                            log,
-                            f"   Trigger:  Agent B has left the environment."
-                        )
-                        aiB_state = 'EXITED'
-                        agent_xB = None
-                        agent_yB = None
-                        agent_facingB = None
-                    case "TELEPORT":
-                        write_to_log(
-                            log,
-                            f"   Trigger:  Agent B teleported from {the_world.get_cell(agent_xB, agent_yB)} to {the_world.get_cell(trigger[1], trigger[2])}"
-                        )
-                        agent_xB = trigger[1]
-                        agent_yB = trigger[2]
-
-                    case "GOAL_TRIGGERED":
-                        # if trigger[1] == 0:
-                        #     write_to_log(
-                        #         log,
-                        #         f"   Trigger:  Agent B activated goal {trigger[2]}"
-                        #     )
-                        #     write_to_log(
-                        #         log,
-                        #         f"   Trigger:  Your team has completed this map in {turn} turns. SUCCESS"
-                        #     )
-                        #     run = False
-                        # else:
-                        pointsB += POINTS_PER_GOAL
-                        write_to_log(
-                            log,
-                            f"   Trigger:  Agent B activated goal {trigger[2]}"
-                        )
-                    case "NONE":
-                        pass
-
-
-                write_to_log(
-                    log,
-                    f"   End:      {agent_xB},{agent_yB}"
+            if all(agent.state != 'GOOD' for agent in agents):
+                turns_played = turn - 1
+                log.write(simlog.SUMMARY, "-----Scenario finished-----")
+                log.write(
+                    simlog.SUMMARY,
+                    "FINAL AGENT STATES:" + "".join(f"\nAgent {agent.name} {agent.state}" for agent in agents)
                 )
+                break
+
+            log.write(simlog.TURNS, "-----Turn {}-----", turn)
+
+            if simultaneous:
+                # Everyone sees the same world and last turn's messages
+                messages = [agent.msg for agent in agents]
+                all_percepts = {}
+                for agent in agents:
+                    if agent.state == 'GOOD':
+                        if timing is not None:
+                            timing.start()
+                        all_percepts[agent.index] = get_percepts(the_world, agent.x, agent.y, agent.facing)
+                        if timing is not None:
+                            timing.lap('percepts', agent.index)
+                        budget.start(agent, all_percepts[agent.index], messages[agent.index - 1])
+                        if timing is not None:
+                            timing.lap('update', agent.index)
+
+            for agent in agents:
+                if agent.state != 'GOOD':
+                    continue
+
+                if timing is not None:
+                    timing.start()
+                agent.points += 1
+                start = (agent.x, agent.y)
+
+                if simultaneous:
+                    percepts = all_percepts[agent.index]
+                else:
+                    # What does the agent see?
+                    percepts = get_percepts(the_world, agent.x, agent.y, agent.facing)
+                    if timing is not None:
+                        timing.lap('percepts', agent.index)
+
+                # Get agent's command
+                if simultaneous:
+                    finish_decision(agent, budget, log)
+                else:
+                    decide(agent, percepts, agents[agent.index - 1].msg, budget, log)
+                if timing is not None:
+                    timing.lap('update', agent.index)
+
+                log.write(simlog.TURNS, "Agent {}", agent.name)
+                log.write(simlog.TURNS, "   Start:    {},{}", agent.x, agent.y)
+                if log.enabled(simlog.PERCEPTS):
+                    log.write(simlog.PERCEPTS, "   Percepts: {}", simlog.format_percepts(percepts))
+                log.write(simlog.TURNS, "   Command:  {}", agent.cmd)
+                if timing is not None:
+                    timing.lap('log', agent.index)
+
+                if recorder is not None:
+                    recorder.record(agent.cmd)
+                    if timing is not None:
+                        timing.lap('record', agent.index)
+
+                # Move the agent
+                trigger_name = apply_command(the_world, agent, POINTS_PER_GOAL, log)
+                if timing is not None:
+                    timing.lap('apply', agent.index)
+
+                if trace is not None:
+                    trace.record(
+                        turn,
+                        agent.index,
+                        start,
+                        (agent.x, agent.y),
+                        agent.cmd,
+                        trigger_name,
+                        simtrace.message_size(agent.msg)
+                    )
+                    if timing is not None:
+                        timing.lap('trace', agent.index)
+
+            if use_display:
+                if timing is not None:
+                    timing.start()
+                update_display(disp, agents)
+                if timing is not None:
+                    timing.lap('display')
+                time.sleep(display_speed)
+                if timing is not None:
+                    timing.lap('sleep')
+
+            if max_turns is not None and turn >= max_turns:
+                log.write(simlog.SUMMARY, "---MAX TURNS REACHED---")
+                turns_played = turn
+                break
+
+            if timing is not None:
+                timing.start()
+            log.end_turn()
+            if timing is not None:
+                timing.lap('log')
+            if checkpointer is not None and checkpointer.due(turn):
+                checkpointer.save(the_world, max_turns, simultaneous, turn + 1, agents)
+            turn += 1
+
+        if timing is not None:
+            timing.end(turns_played)
+
+        scores = [agent.points if agent.state == 'EXITED' else 0 for agent in agents]
+
+        log.write(simlog.SUMMARY, "\nFINAL SCORE")
+        for agent, score in zip(agents, scores):
+            log.write(simlog.SUMMARY, "Agent {} received {} points and scored {} points.", agent.name, agent.points, score)
+        log.write(simlog.SUMMARY, "TOTAL: {}", sum(scores))
+    finally:
+        # Buffered log lines still reach the file when the run is interrupted
+        log.close()
+        if budget is not None:
+            budget.close()
 
-
-            else:
-                write_to_log(log, f"Agent B invalid command: {agent_cmdB}")
-                write_to_log(log, "Agent B - FAILURE")
-                aiB_state = 'BAD'
-            
-
-        if use_display:
-            disp.update(
-                agent_xA,
-                agent_yA,
-                agent_facingA,
-                agent_xB,
-                agent_yB,
-                agent_facingB
-            )
-            time.sleep(display_speed)
-
-        if max_turns is not None:
-            if turn >= max_turns:
-                write_to_log(
-                    log,
-                    f"---MAX TURNS REACHED---"
-                )
-                run = False
-                continue
-            
-        turn += 1
-
-
-    A_points_scored = pointsA if aiA_state == 'EXITED' else 0
-    B_points_scored = pointsB if aiB_state == 'EXITED' else 0
-        
-    write_to_log(
-        log,
-        f"\nFINAL SCORE"
-    )
-    write_to_log(
-        log,
-        f"Agent A received {pointsA} points and scored {A_points_scored} points."
-    )
-    write_to_log(
-        log,
-        f"Agent B received {pointsB} points and scored {B_points_scored} points."
-    )
-    write_to_log(
-        log,
-        f"TOTAL: {A_points_scored + B_points_scored}"
-    )
-        
     if use_display:
         disp.quit()
 
+    return {
+        'turns': turns_played,
+        'points': [agent.points for agent in agents],
+        'scores': scores,
+        'states': [agent.state for agent in agents],
+        'total': sum(scores),
+        'update_times': [agent.times for agent in agents],
+        'overruns': [budget.overruns.get(agent.index, 0) if budget is not None else 0 for agent in agents],
+    }
+
 def get_percepts(the_world, agent_x, agent_y, agent_facing):
     # percepts = the_world.get_cells_around(agent_x, agent_y)
     percepts = {'X':[the_world.get_cell(agent_x, agent_y)]}
     for d, v in DIRECTIONS.items():
         dx, dy = v
-        ray = the_world.raycast(agent_x, agent_y, dx, dy)
-        ray = the_world.prune_raycast(ray)
-        percepts[d] = ray
+        percepts[d] = the_world.cast_ray(agent_x, agent_y, dx, dy)
 
     # percepts = [the_world.get_cell(agent_x, agent_y)]
     # dx, dy = DIRECTIONS[agent_facing]
@@ -368,13 +392,6 @@ def get_percepts(the_world, agent_x, agent_y, agent_facing):
 def validate_agent_cmd(cmd):
     return cmd in VALID_COMMANDS
 
-def write_to_log(log, msg):
-    if log is not None:
-        log.write(f"{msg}\n")
-        log.flush()
-    else:
-        print(msg)
-
 def turn_right(cur_facing):
     match cur_facing:
         case 'N': return 'E'
@@ -0,0 +1,76 @@
+import sys
+
+# Verbosity levels, each including the ones before it
+OFF = 0
+SUMMARY = 1   # Final states and scores
+TURNS = 2     # Turn headers, agent positions, commands and triggers
+PERCEPTS = 3  # Full percepts every turn
+
+LEVELS = {'off': OFF, 'summary': SUMMARY, 'turns': TURNS, 'percepts': PERCEPTS}
+
+
+class SimLog:
+    """
+    Buffered simulation log. Lines above the log's level are dropped before
+    their message is formatted, so write() with format arguments costs
+    almost nothing when the level is off. Lines are buffered and written out
+    at turn boundaries once the buffer is large enough, and at close().
+
+    out is a file, or None to print to stdout. buffer_size=0 writes and
+    flushes every line.
+    """
+
+    def __init__(self, out=None, level=PERCEPTS, buffer_size=1 << 16):
+        self.out = out
+        self.level = level
+        self.buffer_size = buffer_size
+        self.lines = []
+        self.buffered = 0
+
+    def enabled(self, level):
+        return level <= self.level
+
+    def write(self, level, msg, *args):
+        if level > self.level:
+            return
+        if args:
+            msg = msg.format(*args)
+        self.lines.append(msg)
+        self.buffered += len(msg) + 1
+        if self.buffer_size == 0:
+            self.flush()
+
+    def end_turn(self):
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.lines:
+            return
+        text = "\n".join(self.lines) + "\n"
+        self.lines = []
+        self.buffered = 0
+        if self.out is None:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+        else:
+            self.out.write(text)
+            self.out.flush()
+
+    def close(self):
+        # Ends the episode; the underlying file is left open
+        self.flush()
+
+
+def as_log(log):
+    # run_sim accepts a SimLog, a file or None (stdout), as before
+    if isinstance(log, SimLog):
+        return log
+    return SimLog(log)
+
+
+def format_percepts(percepts):
+    percept_str = ""
+    for k, v in percepts.items():
+        percept_str += f"({k} {v}) "
+    return percept_str
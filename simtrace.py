@@ -0,0 +1,158 @@
+import gzip
+import json
+import itertools
+import struct
+from collections import namedtuple
+
+# Binary trace: the magic and version, then fixed-size little-endian records.
+# Positions are -1,-1 once an agent has left the world.
+TRACE_MAGIC = b"MWT1"
+TRACE_VERSION = 1
+TRACE_HEADER = struct.Struct("<4sH")
+TRACE_RECORD = struct.Struct("<IBiiiiBBI")
+
+COMMANDS = ['N', 'E', 'S', 'W', 'U']
+TRIGGERS = ['NONE', 'EXIT', 'TELEPORT', 'GOAL_TRIGGERED', 'INVALID']
+INVALID_COMMAND = 255
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+TraceRecord = namedtuple(
+    'TraceRecord',
+    ['turn', 'agent', 'start_x', 'start_y', 'end_x', 'end_y', 'command', 'trigger', 'msg_size']
+)
+
+
+def message_size(msg):
+    # Entries an agent's message carries: the cells of its sets, one per
+    # teleport and one for a known exit. Sequence numbers and flags are not
+    # content, and a position counts once, not per coordinate.
+    if isinstance(msg, (set, frozenset, list)):
+        return len(msg)
+    if not isinstance(msg, dict):
+        return 0
+    size = 0
+    for key, value in msg.items():
+        if key == 'exit_position':
+            size += value is not None
+        elif isinstance(value, (dict, set, frozenset, list)):
+            size += len(value)
+    return size
+
+
+class TraceWriter:
+    """
+    Writes one record per agent per turn, as struct-packed binary or as
+    JSON lines, optionally gzip compressed. Records are packed into a
+    buffer and written in large chunks.
+    """
+
+    def __init__(self, filename, jsonl=False, compress=False, buffer_size=1 << 16):
+        self.jsonl = jsonl
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        if compress:
+            self.f = gzip.open(filename, 'wb')
+        else:
+            self.f = open(filename, 'wb')
+        if not jsonl:
+            self.f.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION))
+
+    def record(self, turn, agent, start, end, command, trigger, msg_size):
+        if end[0] is None:
+            end = (-1, -1)
+        if self.jsonl:
+            self.buffer += json.dumps({
+                'turn': turn,
+                'agent': agent,
+                'start': list(start),
+                'end': list(end),
+                'command': command,
+                'trigger': trigger,
+                'msg_size': msg_size,
+            }).encode("utf-8") + b"\n"
+        else:
+            self.buffer += TRACE_RECORD.pack(
+                turn,
+                agent,
+                start[0], start[1],
+                end[0], end[1],
+                COMMANDS.index(command) if command in COMMANDS else INVALID_COMMAND,
+                TRIGGERS.index(trigger),
+                msg_size
+            )
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.f.write(self.buffer)
+        self.buffer = bytearray()
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+
+def open_trace(filename):
+    # Format from the file name: .jsonl for JSON lines, .gz for compressed
+    compress = filename.endswith(".gz")
+    jsonl = filename.removesuffix(".gz").endswith(".jsonl")
+    return TraceWriter(filename, jsonl, compress)
+
+
+def read_trace(filename):
+    """
+    Streams the records of a trace in either format, compressed or not,
+    without loading the whole file.
+    """
+    with open(filename, 'rb') as raw:
+        compressed = raw.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+    f = gzip.open(filename, 'rb') if compressed else open(filename, 'rb')
+    with f:
+        header = f.read(TRACE_HEADER.size)
+        if len(header) == TRACE_HEADER.size and header[:len(TRACE_MAGIC)] == TRACE_MAGIC:
+            version = TRACE_HEADER.unpack(header)[1]
+            if version != TRACE_VERSION:
+                raise ValueError(f"Trace {filename} has unsupported version {version}.")
+            yield from read_binary_records(f)
+        else:
+            yield from read_jsonl_records(header, f)
+
+
+def read_binary_records(f):
+    size = TRACE_RECORD.size
+    leftover = b""
+    while True:
+        chunk = f.read(size * 4096)
+        if not chunk:
+            break
+        data = leftover + chunk
+        end = len(data) - len(data) % size
+        for (turn, agent, sx, sy, ex, ey, command, trigger, msg_size) in TRACE_RECORD.iter_unpack(data[:end]):
+            yield TraceRecord(
+                turn, agent, sx, sy, ex, ey,
+                COMMANDS[command] if command < len(COMMANDS) else None,
+                TRIGGERS[trigger],
+                msg_size
+            )
+        leftover = data[end:]
+    if leftover:
+        raise ValueError("Trace ends with a truncated record.")
+
+
+def read_jsonl_records(start, f):
+    # start holds the bytes already read while looking for the binary header
+    lines = itertools.chain((start + f.readline()).splitlines(), f)
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        yield TraceRecord(
+            record['turn'],
+            record['agent'],
+            record['start'][0], record['start'][1],
+            record['end'][0], record['end'][1],
+            record['command'] if record['command'] in COMMANDS else None,
+            record['trigger'],
+            record['msg_size']
+        )
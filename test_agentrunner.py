@@ -0,0 +1,32 @@
+import threading
+import types
+
+import aiB
+import agentrunner
+import generator
+import sim
+import simlog
+
+
+class HangingAI:
+    # Answers its first turn, then never answers again
+    def __init__(self, max_turns):
+        self.turns = 0
+        self.release = threading.Event()
+
+    def update(self, percepts, msg):
+        self.turns += 1
+        if self.turns > 1:
+            self.release.wait()
+        return 'N', None
+
+
+def test_hung_agent_runs_out_of_time_under_repeat():
+    the_world = generator.generate_world(16, 16, 0, goals=1)
+    budget = agentrunner.TimeBudget(per_turn=0.05, total=1.0, policy='repeat')
+    modules = [types.SimpleNamespace(AI=HangingAI), aiB]
+    result = sim.run_sim(the_world, 50, simlog.SimLog(level=simlog.OFF), ai_modules=modules, budget=budget)
+
+    assert result['states'][0] == 'BAD'
+    # The total budget ends the agent well before its 50 turns are up
+    assert result['overruns'][0] < 40
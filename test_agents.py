@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+import aiA
+import aiB
+import bench
+import simlog
+import world
+
+WORLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worlds")
+
+
+class GoalTrace:
+    # The turns on which an agent collected a goal
+    def __init__(self):
+        self.turns = []
+
+    def record(self, turn, agent, start, end, command, trigger, msg_size):
+        if trigger == 'GOAL_TRIGGERED':
+            self.turns.append(turn)
+
+
+def goal_turns(name, seed, full):
+    the_world = world.make_world(os.path.join(WORLDS, name))
+    the_world.load_world()
+    stats = {'time': 0.0, 'updates': 0}
+    modules = [bench.ray_module(aiA, full, stats), bench.ray_module(aiB, full, stats)]
+    trace = GoalTrace()
+    bench.run_quiet(the_world, 1000, simlog.SimLog(level=simlog.OFF), seed=seed, ai_modules=modules, trace=trace)
+    return trace.turns
+
+
+@pytest.mark.parametrize("name", ["world2", "world3", "world_test"])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_whole_rays_collect_goals_no_later(name, seed):
+    # Against agents that take in only the first cell of each ray: as many
+    # goals, each collected no later than before
+    before = goal_turns(name, seed, full=False)
+    after = goal_turns(name, seed, full=True)
+    assert len(after) >= len(before)
+    assert all(a <= b for a, b in zip(after, before))
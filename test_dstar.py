@@ -0,0 +1,87 @@
+import collections
+import random
+
+import dstar
+import knownmap
+
+
+def bfs(known, start, goals):
+    # Steps from start to the nearest free goal over free cells, None if unreachable
+    goals = {goal for goal in goals if known.is_free(goal)}
+    if not known.is_free(start):
+        return None
+    dist = {start: 0}
+    queue = collections.deque([start])
+    while queue:
+        cell = queue.popleft()
+        if cell in goals:
+            return dist[cell]
+        for n in knownmap.neighbors(cell):
+            if known.is_free(n) and n not in dist:
+                dist[n] = dist[cell] + 1
+                queue.append(n)
+    return None
+
+
+def random_cell(rng, radius):
+    return (rng.randint(-radius, radius), rng.randint(-radius, radius))
+
+
+def test_dstar_matches_bfs_after_changes():
+    rng = random.Random(0)
+    for _ in range(300):
+        known = knownmap.KnownMap(4)
+        planner = dstar.DStarLite(known)
+        start = (0, 0)
+        known.set(start, knownmap.FREE)
+        goals = set()
+        for _ in range(40):
+            # Cells turning free or into walls, as the agent sees more
+            for _ in range(rng.randint(0, 8)):
+                cell = random_cell(rng, 8)
+                if cell != start:
+                    known.set(cell, rng.choice([knownmap.FREE, knownmap.FREE, knownmap.WALL]))
+            if rng.random() < 0.5:
+                goals = {random_cell(rng, 8) for _ in range(rng.randint(0, 4))}
+
+            planner.update(start, goals)
+            distance = bfs(known, start, goals)
+            assert planner.g.get(start, dstar.INFINITY) == (dstar.INFINITY if distance is None else distance)
+
+            move = planner.next_move(start, goals)
+            if distance is None:
+                assert move is None
+            elif distance > 0:
+                d_row, d_col = knownmap.STEPS[move]
+                assert bfs(known, (start[0] + d_row, start[1] + d_col), goals) == distance - 1
+
+            # The agent steps to a free neighbor, or now and then teleports
+            free = [n for n in knownmap.neighbors(start) if known.is_free(n)]
+            if free and rng.random() < 0.7:
+                start = rng.choice(free)
+            elif rng.random() < 0.1:
+                start = random_cell(rng, 8)
+                known.set(start, knownmap.FREE)
+
+
+def test_dstar_path_reaches_nearest_goal():
+    rng = random.Random(1)
+    for _ in range(100):
+        known = knownmap.KnownMap(4)
+        planner = dstar.DStarLite(known)
+        for row in range(-6, 7):
+            for col in range(-6, 7):
+                known.set((row, col), knownmap.WALL if rng.random() < 0.3 else knownmap.FREE)
+        start = (0, 0)
+        known.set(start, knownmap.FREE)
+        goals = {random_cell(rng, 6) for _ in range(3)}
+
+        path = planner.path(start, goals)
+        distance = bfs(known, start, goals)
+        if distance is None:
+            assert path is None
+            continue
+        assert len(path) == distance
+        if path:
+            assert path[-1][1] in goals
+            assert planner.next_move(start, goals) == path[0][0]
@@ -0,0 +1,26 @@
+import random
+
+import pytest
+
+import knownmap
+
+
+def nearest(cells, cell):
+    return min(abs(cell[0] - target[0]) + abs(cell[1] - target[1]) for target in cells)
+
+
+@pytest.mark.parametrize("scan_targets", [0, knownmap.SCAN_TARGETS])
+def test_frontier_index_matches_min(scan_targets):
+    rng = random.Random(0)
+    for _ in range(300):
+        spread = rng.choice([3, 20, 200])
+        cells = {(rng.randrange(-spread, spread), rng.randrange(-spread, spread)) for _ in range(rng.randrange(1, 200))}
+        index = knownmap.FrontierIndex(cells, rng.choice([1, 4, knownmap.BUCKET_SIZE]), scan_targets)
+        for _ in range(20):
+            cell = (rng.randrange(-2 * spread, 2 * spread), rng.randrange(-2 * spread, 2 * spread))
+            assert index.distance(cell) == nearest(cells, cell)
+
+
+def test_frontier_index_without_targets():
+    with pytest.raises(ValueError):
+        knownmap.FrontierIndex([], scan_targets=0).distance((0, 0))
@@ -0,0 +1,119 @@
+import sys
+import time
+import math
+
+# Histogram buckets per doubling of the duration in nanoseconds. Bucket
+# bounds are within 2**(1/8), about 9%, of each other.
+BUCKETS_PER_DOUBLING = 8
+BUCKETS = 64 * BUCKETS_PER_DOUBLING
+
+# Phases of a turn, in the order run_sim goes through them
+PHASES = ['percepts', 'update', 'log', 'record', 'apply', 'trace', 'display', 'sleep']
+
+
+class Histogram:
+    """Counts of durations in log-spaced buckets, with the exact max and total."""
+
+    __slots__ = ['counts', 'count', 'total', 'max']
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        nanoseconds = seconds * 1e9
+        bucket = int(math.log2(nanoseconds) * BUCKETS_PER_DOUBLING) if nanoseconds > 1 else 0
+        self.counts[min(bucket, BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        # Upper bound of the bucket holding the p-th percentile, in seconds
+        if self.count == 0:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for bucket, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(2 ** ((bucket + 1) / BUCKETS_PER_DOUBLING) / 1e9, self.max)
+        return self.max
+
+
+class Timing:
+    """
+    Per-phase, per-agent timings for run_sim. The loop calls start() at the
+    top of a stretch of work and lap(phase, agent) at the end of each phase,
+    which adds the time since the last start() or lap() to that phase's
+    histogram. agent is None for phases that belong to the whole turn.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.last = None
+        self.turns = 0
+        self.started = None
+        self.elapsed = 0.0
+
+    def begin(self):
+        self.started = time.perf_counter()
+
+    def end(self, turns):
+        self.turns = turns
+        self.elapsed = time.perf_counter() - self.started
+
+    def start(self):
+        self.last = time.perf_counter()
+
+    def lap(self, phase, agent=None):
+        now = time.perf_counter()
+        key = (phase, agent)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram()
+        self.histograms[key].add(now - self.last)
+        self.last = now
+
+    def summary(self):
+        # One row per phase and agent, in phase order
+        rows = []
+        order = {phase: i for i, phase in enumerate(PHASES)}
+        keys = sorted(
+            self.histograms,
+            key=lambda key: (order.get(key[0], len(PHASES)), key[0], -1 if key[1] is None else key[1])
+        )
+        for phase, agent in keys:
+            histogram = self.histograms[(phase, agent)]
+            rows.append({
+                'phase': phase,
+                'agent': '' if agent is None else agent,
+                'count': histogram.count,
+                'total_s': histogram.total,
+                'p50_us': histogram.percentile(50) * 1e6,
+                'p95_us': histogram.percentile(95) * 1e6,
+                'max_us': histogram.max * 1e6,
+            })
+        return rows
+
+    def turns_per_second(self):
+        return self.turns / self.elapsed if self.elapsed else 0.0
+
+    def print_summary(self, out=None):
+        out = out or sys.stdout
+        out.write(f"{self.turns} turns in {self.elapsed:.3f} s, {self.turns_per_second():.1f} turns/s\n")
+        out.write(f"{'phase':<10}{'agent':>6}{'count':>9}{'total s':>10}{'p50 us':>10}{'p95 us':>10}{'max us':>11}\n")
+        for row in self.summary():
+            out.write(
+                f"{row['phase']:<10}{str(row['agent']):>6}{row['count']:>9}{row['total_s']:>10.4f}"
+                f"{row['p50_us']:>10.1f}{row['p95_us']:>10.1f}{row['max_us']:>11.1f}\n"
+            )
+
+    def write_csv(self, filename):
+        columns = ['phase', 'agent', 'count', 'total_s', 'p50_us', 'p95_us', 'max_us']
+        with open(filename, 'w') as f:
+            f.write(",".join(columns) + "\n")
+            for row in self.summary():
+                f.write(",".join(str(row[c]) for c in columns) + "\n")
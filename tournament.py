@@ -0,0 +1,290 @@
+import sys
+import os
+import ast
+import json
+import hashlib
+import importlib
+import importlib.util
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+import misc
+import sim
+import simlog
+import batch
+
+# Bump to throw away every cached result
+CACHE_VERSION = 1
+CACHE_DIR = ".tournament_cache"
+
+# Simulator modules whose source is part of every key, as they decide
+# how an episode plays out
+ENGINE_MODULES = ['sim', 'world']
+# AI modules sim imports for its default agents; they are part of a key
+# only when they play in the pairing
+DEFAULT_AI_MODULES = ['aiA', 'aiB']
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def module_file(name):
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.origin is None or not spec.origin.endswith(".py"):
+        return None
+    return spec.origin
+
+
+def local_modules(name, seen=None, skip=()):
+    """
+    The module and every module of this repository it imports, directly or
+    not, as {name: file}. Standard library and installed packages are left
+    out, and so are the modules in skip and whatever only they import.
+    """
+    if seen is None:
+        seen = {}
+    if name in skip:
+        return seen
+    filename = module_file(name)
+    if filename is None or os.path.dirname(os.path.abspath(filename)) != HERE or name in seen:
+        return seen
+    seen[name] = filename
+    with open(filename, 'rb') as f:
+        tree = ast.parse(f.read(), filename)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imported = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            imported = [node.module]
+        else:
+            continue
+        for other in imported:
+            local_modules(other.split(".")[0], seen, skip)
+    return seen
+
+
+def hash_files(files):
+    digest = hashlib.sha256()
+    for name, filename in sorted(files.items()):
+        digest.update(name.encode("utf-8") + b"\0")
+        with open(filename, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def code_hash(pairing):
+    # The pairing in order, and the AI modules and the simulator with
+    # their local imports
+    files = {}
+    for name in pairing:
+        local_modules(name, files)
+    for name in ENGINE_MODULES:
+        local_modules(name, files, DEFAULT_AI_MODULES)
+    return ",".join(pairing) + ":" + hash_files(files)
+
+
+def world_hash(world_filename):
+    with open(world_filename, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def episode_key(code, world_digest, seed, max_turns):
+    key = f"{CACHE_VERSION}\0{code}\0{world_digest}\0{seed}\0{max_turns}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Episode results as JSON files named by their key, two levels deep."""
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        try:
+            with open(self.path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, row):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = path + ".tmp"
+        with open(temporary, 'w') as f:
+            json.dump(row, f)
+        os.replace(temporary, path)
+
+
+def run_match(match):
+    pairing, world_filename, seed, max_turns = match
+    the_world = batch.get_world(world_filename)
+    ai_modules = [importlib.import_module(name) for name in pairing]
+
+    log = simlog.SimLog(level=simlog.OFF)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        result = sim.run_sim(the_world, max_turns, log, ai_modules=ai_modules, seed=seed)
+
+    return {
+        'A': pairing[0],
+        'B': pairing[1],
+        'world': world_filename,
+        'seed': seed,
+        'turns': result['turns'],
+        'scoreA': result['scores'][0],
+        'scoreB': result['scores'][1],
+        'total': result['total'],
+        'stateA': result['states'][0],
+        'stateB': result['states'][1],
+    }
+
+
+def run_tournament(pairings, world_filenames, seeds, max_turns, workers=None, cache=None):
+    """
+    Plays every pairing of AI module names on every world and seed. Results
+    found in the cache are reused; the rest run on a process pool (in this
+    process with workers=1) and are added to the cache. Returns the rows in
+    pairing, world, seed order, each with 'cached' set, and the number of
+    episodes that were run.
+    """
+    if cache is None:
+        cache = ResultCache()
+    codes = {pairing: code_hash(pairing) for pairing in pairings}
+    worlds = {w: world_hash(w) for w in world_filenames}
+
+    matches = [
+        (pairing, w, seed, max_turns)
+        for pairing in pairings
+        for w in world_filenames
+        for seed in seeds
+    ]
+    keys = [episode_key(codes[m[0]], worlds[m[1]], m[2], m[3]) for m in matches]
+    rows = [cache.get(key) for key in keys]
+    for row in rows:
+        if row is not None:
+            row['cached'] = True
+
+    todo = [i for i, row in enumerate(rows) if row is None]
+    if todo:
+        if workers == 1:
+            results = map(run_match, [matches[i] for i in todo])
+            pool = contextlib.nullcontext()
+        else:
+            workers = workers or os.cpu_count() or 1
+            pool = ProcessPoolExecutor(max_workers=workers)
+            chunksize = max(1, len(todo) // (workers * 4))
+            results = pool.map(run_match, [matches[i] for i in todo], chunksize=chunksize)
+        with pool:
+            for i, row in zip(todo, results):
+                cache.put(keys[i], row)
+                row['cached'] = False
+                rows[i] = row
+
+    return rows, len(todo)
+
+
+COLUMNS = ['A', 'B', 'world', 'seed', 'turns', 'scoreA', 'scoreB', 'total', 'stateA', 'stateB', 'cached']
+
+
+def summarize(rows):
+    # Per pairing: episodes, mean total score and how many agents exited
+    summary = {}
+    for row in rows:
+        pairing = (row['A'], row['B'])
+        entry = summary.setdefault(pairing, {'episodes': 0, 'total': 0, 'exits': 0})
+        entry['episodes'] += 1
+        entry['total'] += row['total']
+        entry['exits'] += (row['stateA'] == 'EXITED') + (row['stateB'] == 'EXITED')
+    return summary
+
+
+def print_summary(rows):
+    print(f"{'A':<10}{'B':<10}{'episodes':>10}{'mean total':>12}{'exits':>8}")
+    for (a, b), entry in summarize(rows).items():
+        print(f"{a:<10}{b:<10}{entry['episodes']:>10}{entry['total'] / entry['episodes']:>12.1f}{entry['exits']:>8}")
+
+
+def write_csv(rows, filename):
+    with open(filename, 'w') as f:
+        f.write(",".join(COLUMNS) + "\n")
+        for row in rows:
+            f.write(",".join(str(row[c]) for c in COLUMNS) + "\n")
+
+
+def main():
+
+    pairings = []
+    world_filenames = []
+    first_seed = 0
+    last_seed = 1
+    max_turns = None
+    workers = None
+    cache_dir = CACHE_DIR
+    output_filename = None
+
+    args = sys.argv
+
+    if "-h" in args or len(args) == 1:
+        print("Play AI pairings on every world and seed, reusing cached results.")
+        print("Usage: python tournament.py -a <moduleA>,<moduleB> [-a ...] -w <world> [-w ...] -t <max turns>")
+        print("       [-s <first seed> <last seed>] [-j <workers>] [-c <cache dir>] [-o <csv file>]")
+        return
+
+    i = 1
+    while i < len(args):
+        try:
+            if args[i] == "-a":
+                pairing = tuple(args[i+1].split(","))
+                if len(pairing) != 2:
+                    print(f"A pairing is two module names separated by a comma: {args[i+1]}")
+                    return
+                pairings.append(pairing)
+            elif args[i] == "-w":
+                world_filenames.append(args[i+1])
+            elif args[i] == "-s":
+                first_seed = int(args[i+1])
+                last_seed = int(args[i+2])
+            elif args[i] == "-t":
+                max_turns = int(args[i+1])
+            elif args[i] == "-j":
+                workers = int(args[i+1])
+            elif args[i] == "-c":
+                cache_dir = args[i+1]
+            elif args[i] == "-o":
+                output_filename = args[i+1]
+        except (IndexError, ValueError):
+            print("Incorrect command line arguments. Run with -h for help.")
+            return
+
+        i+=1
+
+    if not world_filenames or max_turns is None:
+        print("At least one -w and -t are required. Run with -h for help.")
+        return
+    if not pairings:
+        pairings = [('aiA', 'aiB')]
+
+    for pairing in pairings:
+        for name in pairing:
+            if module_file(name) is None:
+                print(f"AI module {name} was not found.")
+                return
+
+    try:
+        rows, ran = run_tournament(
+            pairings, world_filenames, range(first_seed, last_seed + 1), max_turns, workers, ResultCache(cache_dir)
+        )
+    except (OSError, misc.InvalidCellException, misc.InvalidWorldException) as e:
+        print(e)
+        return
+
+    if output_filename is not None:
+        write_csv(rows, output_filename)
+    print_summary(rows)
+    print(f"{ran} episodes run, {len(rows) - ran} from cache")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import numpy as np
+
+import world
+import sim
+
+GOOD = 0
+EXITED = 1
+BAD = 2
+STATE_NAMES = ['GOOD', 'EXITED', 'BAD']
+
+# Command codes, in the order of COMMANDS. Anything else is invalid.
+COMMANDS = ['N', 'E', 'S', 'W', 'U']
+USE = 4
+INVALID = 255
+
+# Ray directions in percept order
+RAY_DIRECTIONS = ['N', 'E', 'S', 'W']
+
+# Code used for cells beyond a ray's end
+NO_CELL = 255
+
+WALL_CODE = world.FLAG_TO_CODE[ord('w')]
+FLOOR_CODE = world.FLAG_TO_CODE[ord('g')]
+EXIT_CODE = world.FLAG_TO_CODE[ord('r')]
+
+
+def command_codes(commands):
+    # Command strings to codes, INVALID for anything that is not a command
+    return np.array(
+        [COMMANDS.index(cmd) if cmd in COMMANDS else INVALID for cmd in commands],
+        dtype=np.uint8
+    )
+
+
+class VecSim:
+    """
+    Runs N worlds, each with the same number of agents, in lock step with
+    all state held in NumPy arrays. Worlds of different sizes are padded to
+    a common stride with a wall border, so moves never leave the arrays.
+
+    A turn follows sim.run_sim: agents act in order, and each agent sees the
+    world as left by the agents before it in the same turn. For each agent,
+    percepts() gives its view in every world and apply() applies one command
+    per world. Scoring matches run_sim: one point per turn alive,
+    POINTS_PER_GOAL = max_turns per goal, and points only count if the
+    agent EXITED.
+    """
+
+    def __init__(self, worlds, max_turns, agents=2, view=None):
+        self.n = len(worlds)
+        self.agents = agents
+        self.max_turns = max_turns
+        self.points_per_goal = max_turns if max_turns is not None else 0
+
+        compact = [self.as_compact(the_world) for the_world in worlds]
+        self.widths = np.array([w.width for w in compact], dtype=np.int64)
+        self.heights = np.array([w.height for w in compact], dtype=np.int64)
+        self.stride = int(self.widths.max()) + 2
+        rows = int(self.heights.max()) + 2
+        size = self.stride * rows
+        self.view = view if view is not None else max(self.stride, rows)
+
+        self.codes = np.full((self.n, size), WALL_CODE, dtype=np.uint8)
+        # Ray lengths per direction, indexed like codes
+        self.ray_len = np.zeros((self.n, 4, size), dtype=np.int64)
+        # Teleport destination per env and cell code, -1 if there is none
+        self.teleport_to = np.full((self.n, 256), -1, dtype=np.int64)
+        self.goals_left = np.zeros(self.n, dtype=np.int64)
+        starts = np.zeros((self.n, 2), dtype=np.int64)
+
+        for e, the_world in enumerate(compact):
+            cells = np.frombuffer(the_world.cell_codes(), dtype=np.uint8)
+            cells = cells.reshape(the_world.height, the_world.width)
+            grid = self.codes[e].reshape(rows, self.stride)
+            grid[1:1 + the_world.height, 1:1 + the_world.width] = cells
+
+            if the_world.wall_dist is None:
+                the_world.build_wall_distances()
+            for d, (dx, dy) in enumerate([(0, -1), (1, 0), (0, 1), (-1, 0)]):
+                table = np.frombuffer(the_world.wall_dist[(dx, dy)], dtype=the_world.wall_dist[(dx, dy)].typecode)
+                lengths = self.ray_len[e, d].reshape(rows, self.stride)
+                lengths[1:1 + the_world.height, 1:1 + the_world.width] = table.reshape(the_world.height, the_world.width)
+
+            for flag, pair in [('b', 'o'), ('o', 'b'), ('y', 'p'), ('p', 'y')]:
+                xy = the_world.find_cell(pair)
+                if xy is not None:
+                    self.teleport_to[e, world.FLAG_TO_CODE[ord(flag)]] = self.flat(xy[0], xy[1])
+            self.goals_left[e] = len(the_world.goals)
+            starts[e] = [self.flat(*the_world.get_startxyA()), self.flat(*the_world.get_startxyB())]
+
+        # Agents alternate between the A and B starting cells
+        self.start = starts[:, [a % 2 for a in range(agents)]]
+        # Moves as flat index steps, in COMMANDS order
+        self.move_steps = np.array([-self.stride, 1, self.stride, -1, 0], dtype=np.int64)
+        self.ray_steps = np.array([-self.stride, 1, self.stride, -1], dtype=np.int64)
+        self.is_wall = np.frombuffer(world.IS_WALL, dtype=np.uint8).astype(bool)
+        self.is_goal = np.frombuffer(world.IS_GOAL, dtype=np.uint8).astype(bool)
+        self.flags = np.array([chr(c) for c in world.CODE_TO_FLAG], dtype=object)
+        self.initial_codes = self.codes.copy()
+        self.initial_goals = self.goals_left.copy()
+        self.reset()
+
+    def as_compact(self, the_world):
+        if isinstance(the_world, world.CompactWorld):
+            return the_world
+        compact = world.CompactWorld(the_world.world_filename)
+        compact.cells = bytearray(
+            b"".join("".join(row).encode("ascii").translate(world.FLAG_TO_CODE) for row in the_world.world_map)
+        )
+        compact.width = the_world.width
+        compact.height = the_world.height
+        compact.start_xA, compact.start_yA = the_world.get_startxyA()
+        compact.start_xB, compact.start_yB = the_world.get_startxyB()
+        compact.positions = {flag: set(cells) for flag, cells in the_world.positions.items()}
+        compact.goals = list(the_world.goals)
+        compact.make_pristine()
+        return compact
+
+    def flat(self, x, y):
+        return (y + 1) * self.stride + x + 1
+
+    def xy(self, index):
+        # Flat indices back to world x, y
+        return index % self.stride - 1, index // self.stride - 1
+
+    def reset(self):
+        self.codes[:] = self.initial_codes
+        self.goals_left[:] = self.initial_goals
+        self.pos = self.start.copy()
+        self.state = np.zeros((self.n, self.agents), dtype=np.uint8)
+        self.points = np.zeros((self.n, self.agents), dtype=np.int64)
+        self.turn = 1
+        self.turns = np.zeros(self.n, dtype=np.int64)
+        self.done = np.zeros(self.n, dtype=bool)
+
+    def active(self, agent):
+        return (self.state[:, agent] == GOOD) & ~self.done
+
+    def percepts(self, agent, rays=True):
+        """
+        Percepts of one agent in every world: the code of the cell it stands
+        on (NO_CELL if it is not active), the length of its four rays, and
+        the rays themselves as an (n, 4, view) array padded with NO_CELL
+        (None when rays is False).
+        """
+        envs = np.arange(self.n)
+        active = self.active(agent)
+        pos = np.where(active, self.pos[:, agent], 0)
+
+        here = np.where(active, self.codes[envs, pos], NO_CELL).astype(np.uint8)
+        lengths = self.ray_len[envs[:, None], np.arange(4)[None, :], pos[:, None]]
+        lengths = np.where(active[:, None], lengths, 0)
+        if not rays:
+            return here, lengths, None
+
+        k = np.arange(1, self.view + 1)
+        index = pos[:, None, None] + self.ray_steps[None, :, None] * k[None, None, :]
+        index = np.clip(index, 0, self.codes.shape[1] - 1)
+        rays = self.codes[envs[:, None, None], index]
+        rays = np.where(k[None, None, :] <= lengths[:, :, None], rays, NO_CELL).astype(np.uint8)
+        return here, lengths, rays
+
+    def percept_dicts(self, agent):
+        # The percepts of run_sim as dicts, None for inactive agents
+        here, lengths, rays = self.percepts(agent)
+        result = []
+        for e in range(self.n):
+            if here[e] == NO_CELL:
+                result.append(None)
+                continue
+            percepts = {'X': [self.flags[here[e]]]}
+            for d, name in enumerate(RAY_DIRECTIONS):
+                percepts[name] = list(self.flags[rays[e, d, :lengths[e, d]]])
+            result.append(percepts)
+        return result
+
+    def apply(self, agent, commands):
+        # One command code per world for one agent
+        commands = np.asarray(commands, dtype=np.uint8)
+        envs = np.arange(self.n)
+        active = self.active(agent)
+        self.points[active, agent] += 1
+
+        invalid = active & (commands >= len(COMMANDS))
+        self.state[invalid, agent] = BAD
+        valid = active & ~invalid
+
+        pos = self.pos[:, agent]
+        step = self.move_steps[np.minimum(commands, USE)]
+        target = pos + np.where(valid, step, 0)
+        target = np.clip(target, 0, self.codes.shape[1] - 1)
+        enterable = ~self.is_wall[self.codes[envs, target]]
+        pos = np.where(valid & enterable, target, pos)
+
+        use = valid & (commands == USE)
+        cell = self.codes[envs, np.where(use, pos, 0)]
+
+        exits = use & (cell == EXIT_CODE)
+        self.state[exits, agent] = EXITED
+        pos = np.where(exits, -1, pos)
+
+        destination = self.teleport_to[envs, cell]
+        teleports = use & (destination >= 0)
+        pos = np.where(teleports, destination, pos)
+
+        goals = np.nonzero(use & self.is_goal[cell])[0]
+        if len(goals):
+            # Every cell of the triggered goal becomes floor
+            sub = self.codes[goals]
+            sub[sub == cell[goals, None]] = FLOOR_CODE
+            self.codes[goals] = sub
+            self.goals_left[goals] -= 1
+            self.points[goals, agent] += self.points_per_goal
+
+        self.pos[:, agent] = pos
+
+    def end_turn(self):
+        playing = ~self.done
+        self.turns[playing] = self.turn
+        finished = (self.state != GOOD).all(axis=1)
+        if self.max_turns is not None and self.turn >= self.max_turns:
+            finished[:] = True
+        self.done |= finished
+        self.turn += 1
+
+    def step(self, policy):
+        """
+        Plays one turn. policy(vsim, agent) returns one command code per
+        world for that agent; it may call vsim.percepts(agent).
+        """
+        for agent in range(self.agents):
+            self.apply(agent, policy(self, agent))
+        self.end_turn()
+
+    def run(self, policy):
+        while not self.done.all():
+            self.step(policy)
+        return self.scores()
+
+    def scores(self):
+        return np.where(self.state == EXITED, self.points, 0)
+
+    def results(self):
+        # One row per world, in the shape of run_sim's final report
+        scores = self.scores()
+        return [
+            {
+                'turns': int(self.turns[e]),
+                'points': [int(p) for p in self.points[e]],
+                'scores': [int(s) for s in scores[e]],
+                'states': [STATE_NAMES[s] for s in self.state[e]],
+                'total': int(scores[e].sum()),
+            }
+            for e in range(self.n)
+        ]
+
+
+class AIPolicy:
+    """
+    Drives a VecSim with one Python AI object per agent per world, passing
+    messages as run_sim does: each agent gets the last message of the agent
+    before it. Decisions are not vectorized, only the world updates are.
+    """
+
+    def __init__(self, vsim, ai_modules):
+        self.ais = [
+            [module.AI(vsim.max_turns) for module in ai_modules]
+            for _ in range(vsim.n)
+        ]
+        self.messages = [[None] * len(ai_modules) for _ in range(vsim.n)]
+
+    def __call__(self, vsim, agent):
+        commands = np.full(vsim.n, INVALID, dtype=np.uint8)
+        for e, percepts in enumerate(vsim.percept_dicts(agent)):
+            if percepts is None:
+                continue
+            msg = self.messages[e][agent - 1]
+            cmd, self.messages[e][agent] = self.ais[e][agent].update(percepts, msg)
+            if sim.validate_agent_cmd(cmd):
+                commands[e] = COMMANDS.index(cmd)
+        return commands
+
+
+def random_policy(seed=0):
+    # Vectorized random walk that uses goals and exits when standing on them
+    rng = np.random.default_rng(seed)
+
+    def policy(vsim, agent):
+        here, lengths, rays = vsim.percepts(agent, rays=False)
+        moves = rng.integers(0, 4, vsim.n)
+        usable = (here == EXIT_CODE) | vsim.is_goal[here]
+        return np.where(usable, USE, moves).astype(np.uint8)
+
+    return policy
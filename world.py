@@ -1,4 +1,14 @@
 import misc
+import copy
+import mmap
+import struct
+from array import array
+
+
+def row_major(xy):
+    # Sort key of an (x, y) position in the order a row-major scan meets it
+    return (xy[1], xy[0])
+
 
 class World:
 
@@ -16,6 +26,13 @@ class World:
     # Goal Cells
     GOAL_CELLS = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9']
 
+    # Teleport Cells
+    TELEPORT_CELLS = ['b', 'o', 'y', 'p']
+
+    # Cells whose positions are kept in the position index. These are rare,
+    # so the index stays small even on large maps.
+    INDEXED_CELLS = ['r'] + TELEPORT_CELLS + GOAL_CELLS
+
     DIRECTIONS = ['N', 'E', 'S', 'W']
 
     def __init__(self, world_filename):
@@ -31,6 +48,9 @@ class World:
         self.world_map = []
         self.doors_closed = True
         self.goals = []
+        self.positions = {}
+        # Per indexed flag, the position a row-major scan finds first
+        self.first_positions = {}
 
     def load_world(self):
         try:
@@ -70,19 +90,10 @@ class World:
                     )
 
                 # Parse the world
-                for line in f:
-                    line = line.split()
-                    row = []
-                    for element in line:
-                        if element not in World.VALID_CELLS:
-                            raise misc.InvalidCellException(
-                                f"{element} is not a valid cell type."
-                            )
-                        row.append(element)
-                    self.world_map.append(row)
-
-                self.height = len(self.world_map)
-                self.width = len(self.world_map[0])
+                self.parse_map(f)
+
+                # Index the exit, teleports and goals
+                self.index_cells()
 
                 # Find all the goals
                 self.find_goals()
@@ -90,6 +101,21 @@ class World:
         except FileNotFoundError:
             print(f"{self.world_filename} was not found.")
 
+    def parse_map(self, f):
+        for line in f:
+            line = line.split()
+            row = []
+            for element in line:
+                if element not in World.VALID_CELLS:
+                    raise misc.InvalidCellException(
+                        f"{element} is not a valid cell type."
+                    )
+                row.append(element)
+            self.world_map.append(row)
+
+        self.height = len(self.world_map)
+        self.width = len(self.world_map[0])
+
     def prettyprint_world(self):
         for row in self.world_map:
             for ele in row:
@@ -97,11 +123,39 @@ class World:
             print()
 
 
+    def index_cells(self):
+        self.positions = {}
+        for y in range(len(self.world_map)):
+            for x in range(len(self.world_map[y])):
+                cell = self.world_map[y][x]
+                if cell in World.INDEXED_CELLS:
+                    self.positions.setdefault(cell, set()).add((x, y))
+        self.index_first_positions()
+
+    def index_first_positions(self):
+        self.first_positions = {flag: min(cells, key=row_major) for flag, cells in self.positions.items()}
+
+    def update_index(self, x, y, old_flag, new_flag):
+        if old_flag == new_flag:
+            return
+        if old_flag in World.INDEXED_CELLS:
+            cells = self.positions[old_flag]
+            cells.discard((x, y))
+            if not cells:
+                del self.positions[old_flag]
+                del self.first_positions[old_flag]
+            elif self.first_positions[old_flag] == (x, y):
+                self.first_positions[old_flag] = min(cells, key=row_major)
+        if new_flag in World.INDEXED_CELLS:
+            self.positions.setdefault(new_flag, set()).add((x, y))
+            first = self.first_positions.get(new_flag)
+            if first is None or (y, x) < row_major(first):
+                self.first_positions[new_flag] = (x, y)
+
     def find_goals(self):
-        for row in self.world_map:
-            for ele in row:
-                if ele in World.GOAL_CELLS:
-                    self.goals.append(ele)
+        self.goals = []
+        for flag in World.GOAL_CELLS:
+            self.goals += [flag] * len(self.positions.get(flag, ()))
         self.goals.sort()
 
     def get_width(self):
@@ -126,7 +180,9 @@ class World:
         return self.world_map[y][x]
     
     def set_cell(self, x, y, flag):
+        old_flag = self.world_map[y][x]
         self.world_map[y][x] = flag
+        self.update_index(x, y, old_flag, flag)
 
     def is_valid_cell(self, x, y):
         try:
@@ -168,10 +224,17 @@ class World:
     def prune_raycast(self, cells):
         for i in range(len(cells)):
             if cells[i] in World.WALL_CELLS:
-                break
-        return cells[:i+1]
+                return cells[:i+1]
+        return cells
+
+    # The cells an agent sees in a direction: up to and including the first wall
+    def cast_ray(self, x, y, dx, dy):
+        return self.prune_raycast(self.raycast(x, y, dx, dy))
 
     def find_cell(self, flag):
+        if flag in World.INDEXED_CELLS:
+            return self.first_positions.get(flag)
+
         for y in range(len(self.world_map)):
             for x in range(len(self.world_map[y])):
                 cell = self.get_cell(x, y)
@@ -180,6 +243,11 @@ class World:
         return None
 
     def swap_all_cells(self, flagA, flagB):
+        if flagA in World.INDEXED_CELLS:
+            for x, y in list(self.positions.get(flagA, ())):
+                self.set_cell(x, y, flagB)
+            return
+
         for y in range(len(self.world_map)):
             for x in range(len(self.world_map[y])):
                 cell = self.get_cell(x, y)
@@ -221,3 +289,563 @@ class World:
                 return ["GOAL_TRIGGERED", len(self.goals), cell]
                 
         return ["NONE"]
+
+
+# Cell codes used by CompactWorld. A cell's code is its index in
+# World.VALID_CELLS, so every code fits in one byte.
+CELL_FLAGS = World.VALID_CELLS
+INVALID_CODE = 255
+
+FLAG_TO_CODE = bytearray([INVALID_CODE]) * 256
+for code, flag in enumerate(CELL_FLAGS):
+    FLAG_TO_CODE[ord(flag)] = code
+FLAG_TO_CODE = bytes(FLAG_TO_CODE)
+
+CODE_TO_FLAG = bytearray(256)
+for code, flag in enumerate(CELL_FLAGS):
+    CODE_TO_FLAG[code] = ord(flag)
+CODE_TO_FLAG = bytes(CODE_TO_FLAG)
+
+
+def make_code_table(flags):
+    table = bytearray(256)
+    for flag in flags:
+        table[FLAG_TO_CODE[ord(flag)]] = 1
+    return bytes(table)
+
+
+# Lookup tables indexed by cell code.
+IS_WALL = make_code_table(World.WALL_CELLS)
+IS_GOAL = make_code_table(World.GOAL_CELLS)
+IS_TELEPORT = make_code_table(World.TELEPORT_CELLS)
+
+
+def line_wall_distances(walls, typecode):
+    # For every cell of a line (walls has 1 where the line has a wall), the
+    # number of cells up to and including the next wall ahead of/behind it,
+    # or up to the end of the line.
+    n = len(walls)
+    forward = array(typecode)
+    backward = array(typecode)
+    last = 0     # Previous wall (or the start of the line)
+    covered = 0  # First cell without a backward distance yet
+    p = walls.find(1)
+    while p >= 0:
+        forward.extend(range(p - last, 0, -1))
+        backward.extend(range(covered - last, p - last + 1))
+        last = p
+        covered = p + 1
+        p = walls.find(1, p + 1)
+    forward.extend(range(n - 1 - last, -1, -1))
+    backward.extend(range(covered - last, n - last))
+    return forward, backward
+
+
+def flag_to_code(flag):
+    code = FLAG_TO_CODE[ord(flag)] if len(flag) == 1 and ord(flag) < 256 else INVALID_CODE
+    if code == INVALID_CODE:
+        raise misc.InvalidCellException(
+            f"{flag} is not a valid cell type."
+        )
+    return code
+
+
+class WorldBase:
+    """
+    The pristine state of a loaded CompactWorld: its cell codes, position
+    index and wall-distance tables. It is shared, never modified, by every
+    world forked from the same load.
+    """
+
+    __slots__ = ['cells', 'positions', 'wall_dist']
+
+    def __init__(self, cells, positions):
+        self.cells = cells
+        self.positions = positions
+        self.wall_dist = None
+
+
+class CompactWorld(World):
+    """
+    World that stores the map as one flat buffer of cell codes in row-major
+    order (index = y * width + x) instead of a list of lists of strings.
+    Cells outside the map are rejected by real bounds checks, so negative
+    coordinates no longer wrap around to the other side of the map.
+
+    The loaded cells are never written to. set_cell records changed cells
+    in self.overlay (index -> code) on top of the shared WorldBase, which
+    makes fork(), snapshot() and reset() cost time proportional to the
+    number of changed cells rather than the size of the map. self.cells can
+    be any byte buffer (a bytearray, or a memoryview over a memory-mapped
+    file for BinaryWorld).
+    """
+
+    def __init__(self, world_filename):
+        super().__init__(world_filename)
+        self.cells = bytearray()
+        self.overlay = {}
+        self.base = WorldBase(self.cells, {})
+        # Distance to the next wall per direction, built on first use and
+        # shared with the base until a wall changes.
+        self.wall_dist = None
+        self.own_wall_dist = False
+
+    def load_world(self):
+        super().load_world()
+        if self.cells:
+            self.make_pristine()
+
+    def make_pristine(self):
+        # The current state becomes the state fork() and reset() go back to
+        self.index_first_positions()
+        if self.overlay:
+            self.cells = bytearray(self.cell_codes())
+            self.overlay = {}
+        self.base = WorldBase(
+            self.cells,
+            {flag: set(cells) for flag, cells in self.positions.items()}
+        )
+        if self.wall_dist is not None:
+            self.base.wall_dist = self.wall_dist
+        self.own_wall_dist = False
+
+    def fork(self):
+        # A new world in the pristine state, sharing the base
+        the_world = copy.copy(self)
+        the_world.cells = self.base.cells
+        the_world.overlay = {}
+        the_world.positions = {flag: set(cells) for flag, cells in self.base.positions.items()}
+        the_world.index_first_positions()
+        the_world.wall_dist = self.base.wall_dist
+        the_world.own_wall_dist = False
+        the_world.doors_closed = True
+        the_world.find_goals()
+        return the_world
+
+    def snapshot(self):
+        # A new world in the current state, sharing the base
+        the_world = copy.copy(self)
+        the_world.overlay = dict(self.overlay)
+        the_world.positions = {flag: set(cells) for flag, cells in self.positions.items()}
+        the_world.first_positions = dict(self.first_positions)
+        the_world.goals = list(self.goals)
+        # Neither world may now update the tables in place
+        the_world.own_wall_dist = False
+        self.own_wall_dist = False
+        return the_world
+
+    def reset(self):
+        for index in self.overlay:
+            x = index % self.width
+            y = index // self.width
+            self.update_index(x, y, CELL_FLAGS[self.overlay[index]], CELL_FLAGS[self.cells[index]])
+        self.overlay = {}
+        if self.cells is not self.base.cells:
+            # A bulk swap replaced the cells, so this reset is O(map)
+            self.cells = self.base.cells
+            self.positions = {flag: set(cells) for flag, cells in self.base.positions.items()}
+            self.index_first_positions()
+        if self.own_wall_dist or self.wall_dist is not self.base.wall_dist:
+            self.wall_dist = self.base.wall_dist
+            self.own_wall_dist = False
+        self.doors_closed = True
+        self.find_goals()
+
+    def parse_map(self, f):
+        cells = bytearray()
+        width = None
+        height = 0
+        for line in f:
+            row = line.split()
+            if not row:
+                continue
+
+            # Every valid cell is one ascii character, so the whole row can be
+            # translated to codes in one go and validated afterwards.
+            flags = "".join(row)
+            codes = None
+            if len(flags) == len(row) and flags.isascii():
+                codes = flags.encode("ascii").translate(FLAG_TO_CODE)
+            if codes is None or INVALID_CODE in codes:
+                for element in row:
+                    flag_to_code(element)
+
+            if width is None:
+                width = len(row)
+            elif len(row) != width:
+                raise misc.InvalidWorldException(
+                    f"World {self.world_filename} row {height} has {len(row)} cells, expected {width}."
+                )
+            cells += codes
+            height += 1
+
+        if width is None:
+            raise misc.InvalidWorldException(
+                f"World {self.world_filename} has no cells."
+            )
+
+        self.cells = cells
+        self.width = width
+        self.height = height
+
+    def cell_codes(self):
+        # All cell codes with the changed cells applied
+        if not self.overlay:
+            return bytes(self.cells)
+        cells = bytearray(self.cells)
+        for index, code in self.overlay.items():
+            cells[index] = code
+        return bytes(cells)
+
+    def code_at(self, index):
+        code = self.overlay.get(index)
+        if code is None:
+            return self.cells[index]
+        return code
+
+    def prettyprint_world(self):
+        cells = self.cell_codes()
+        for y in range(self.height):
+            row = cells[y*self.width:(y+1)*self.width]
+            print(" ".join(row.translate(CODE_TO_FLAG).decode("ascii")) + " ")
+
+    def index_cells(self):
+        self.positions = {}
+        self.first_positions = {}
+        for flag in World.INDEXED_CELLS:
+            self.index_flag(flag)
+
+    def index_flag(self, flag):
+        code = FLAG_TO_CODE[ord(flag)]
+        cells = set()
+        index = self.find_code(code)
+        while index >= 0:
+            cells.add((index % self.width, index // self.width))
+            index = self.find_code(code, index + 1)
+        if cells:
+            self.positions[flag] = cells
+            self.first_positions[flag] = min(cells, key=row_major)
+        else:
+            self.positions.pop(flag, None)
+            self.first_positions.pop(flag, None)
+
+    def get_cell(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return CELL_FLAGS[self.code_at(y*self.width + x)]
+        raise IndexError(f"Cell {x},{y} is outside the world.")
+
+    def set_cell(self, x, y, flag):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            code = flag_to_code(flag)
+            index = y*self.width + x
+            old_code = self.code_at(index)
+            if code == self.cells[index]:
+                self.overlay.pop(index, None)
+            else:
+                self.overlay[index] = code
+            self.update_index(x, y, CELL_FLAGS[old_code], flag)
+            if self.wall_dist is not None and IS_WALL[old_code] != IS_WALL[code]:
+                if not self.own_wall_dist:
+                    self.wall_dist = {d: array(table.typecode, table) for d, table in self.wall_dist.items()}
+                    self.own_wall_dist = True
+                self.update_wall_distances(x, y)
+        else:
+            raise IndexError(f"Cell {x},{y} is outside the world.")
+
+    def is_valid_cell(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def is_cell_enterable(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return not IS_WALL[self.code_at(y*self.width + x)]
+        return False
+
+    def read_ray(self, start, step, n):
+        stop = start + n*step
+        if stop < 0:
+            stop = None
+        ray = bytes(self.cells[start:stop:step])
+        if self.overlay:
+            ray = bytearray(ray)
+            for index, code in self.overlay.items():
+                k, r = divmod(index - start, step)
+                if r == 0 and 0 <= k < n:
+                    ray[k] = code
+        return list(ray.translate(CODE_TO_FLAG).decode("ascii"))
+
+    def raycast(self, x, y, dx, dy):
+        if not self.is_valid_cell(x, y) or (dx == 0 and dy == 0):
+            return []
+
+        # Number of steps before the ray leaves the map
+        steps = []
+        if dx > 0:
+            steps.append((self.width - 1 - x) // dx)
+        elif dx < 0:
+            steps.append(x // -dx)
+        if dy > 0:
+            steps.append((self.height - 1 - y) // dy)
+        elif dy < 0:
+            steps.append(y // -dy)
+        n = min(steps)
+        if n <= 0:
+            return []
+
+        step = dy*self.width + dx
+        return self.read_ray(y*self.width + x + step, step, n)
+
+    def find_base_code(self, code, start=0):
+        return self.cells.find(code, start)
+
+    def find_code(self, code, start=0):
+        index = self.find_base_code(code, start)
+        while index >= 0 and self.overlay.get(index, code) != code:
+            index = self.find_base_code(code, index + 1)
+        for changed, changed_code in self.overlay.items():
+            if changed_code == code and changed >= start and (index < 0 or changed < index):
+                index = changed
+        return index
+
+    def find_cell(self, flag):
+        if flag in World.INDEXED_CELLS:
+            return super().find_cell(flag)
+
+        index = self.find_code(flag_to_code(flag))
+        if index < 0:
+            return None
+        return (index % self.width, index // self.width)
+
+    def swap_all_cells(self, flagA, flagB):
+        if flagA in World.INDEXED_CELLS:
+            return super().swap_all_cells(flagA, flagB)
+
+        # A bulk swap gets private cells instead of a huge overlay
+        codeA = flag_to_code(flagA)
+        codeB = flag_to_code(flagB)
+        table = bytearray(range(256))
+        table[codeA] = codeB
+        self.cells = bytearray(self.cell_codes()).translate(table)
+        self.overlay = {}
+        if flagB in World.INDEXED_CELLS:
+            self.index_flag(flagB)
+        if IS_WALL[codeA] != IS_WALL[codeB]:
+            self.wall_dist = None
+            self.own_wall_dist = False
+
+    def build_wall_distances(self):
+        if not self.overlay and self.cells is self.base.cells and self.base.wall_dist is not None:
+            self.wall_dist = self.base.wall_dist
+            return
+
+        width = self.width
+        typecode = 'H' if max(self.width, self.height) < 2**16 else 'I'
+        empty = bytes(array(typecode).itemsize * len(self.cells))
+        self.wall_dist = {d: array(typecode, empty) for d in [(0, -1), (1, 0), (0, 1), (-1, 0)]}
+        north = self.wall_dist[(0, -1)]
+        east = self.wall_dist[(1, 0)]
+        south = self.wall_dist[(0, 1)]
+        west = self.wall_dist[(-1, 0)]
+
+        walls = self.cell_codes().translate(IS_WALL)
+        for y in range(self.height):
+            row = slice(y*width, (y+1)*width)
+            east[row], west[row] = line_wall_distances(walls[row], typecode)
+        for x in range(width):
+            column = slice(x, None, width)
+            south[column], north[column] = line_wall_distances(walls[column], typecode)
+
+        if not self.overlay and self.cells is self.base.cells:
+            self.base.wall_dist = self.wall_dist
+            self.own_wall_dist = False
+        else:
+            self.own_wall_dist = True
+
+    def update_wall_distances(self, x, y):
+        # Only cells behind (x, y) whose rays reach it need new distances,
+        # up to and including the first wall behind it.
+        for (dx, dy), table in self.wall_dist.items():
+            step = dy*self.width + dx
+            cx = x - dx
+            cy = y - dy
+            while 0 <= cx < self.width and 0 <= cy < self.height:
+                index = cy*self.width + cx
+                ahead = index + step
+                table[index] = 1 if IS_WALL[self.code_at(ahead)] else table[ahead] + 1
+                if IS_WALL[self.code_at(index)]:
+                    break
+                cx -= dx
+                cy -= dy
+
+    def cast_ray(self, x, y, dx, dy):
+        if self.wall_dist is None:
+            self.build_wall_distances()
+        table = self.wall_dist.get((dx, dy))
+        if table is None or not self.is_valid_cell(x, y):
+            return super().cast_ray(x, y, dx, dy)
+
+        index = y*self.width + x
+        n = table[index]
+        if n == 0:
+            return []
+        step = dy*self.width + dx
+        return self.read_ray(index + step, step, n)
+
+
+# Binary world format, all little-endian:
+#   header: magic, version, width, height, xA, yA, xB, yB, facings (2 chars),
+#           number of index entries, offset of the cell body
+#   index:  (flag, x, y) for every exit, teleport and goal cell
+#   body:   width*height cell codes in row-major order
+BINARY_MAGIC = b"MWB1"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sHII4i2sII")
+BINARY_INDEX_ENTRY = struct.Struct("<cII")
+
+
+def is_binary_world(world_filename):
+    try:
+        with open(world_filename, "rb") as f:
+            return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    except OSError:
+        return False
+
+
+def make_world(world_filename, compact=True):
+    # World class matching the file format, not loaded yet. CompactWorld is
+    # the default; compact=False gives the list-of-lists World, which has no
+    # wall-distance tables and no fork, snapshot or reset.
+    if is_binary_world(world_filename):
+        return BinaryWorld(world_filename)
+    if compact:
+        return CompactWorld(world_filename)
+    return World(world_filename)
+
+
+def write_text_world(the_world, filename):
+    if isinstance(the_world, CompactWorld):
+        cells = the_world.cell_codes()
+    with open(filename, "w") as f:
+        f.write(f"{the_world.start_xA} {the_world.start_yA} {the_world.start_xB} {the_world.start_yB}\n")
+        f.write(f"{the_world.face_dirA} {the_world.face_dirB}\n")
+        for y in range(the_world.height):
+            if isinstance(the_world, CompactWorld):
+                row = cells[y*the_world.width:(y+1)*the_world.width]
+                row = row.translate(CODE_TO_FLAG).decode("ascii")
+            else:
+                row = the_world.world_map[y]
+            f.write(" ".join(row) + "\n")
+
+
+def write_binary_world(the_world, filename):
+    if isinstance(the_world, CompactWorld):
+        body = the_world.cell_codes()
+    else:
+        body = b"".join(
+            "".join(row).encode("ascii").translate(FLAG_TO_CODE)
+            for row in the_world.world_map
+        )
+    if len(body) != the_world.width * the_world.height:
+        raise misc.InvalidWorldException(
+            f"World {the_world.world_filename} is not rectangular."
+        )
+
+    entries = []
+    for flag in World.INDEXED_CELLS:
+        for x, y in sorted(the_world.positions.get(flag, ()), key=row_major):
+            entries.append(BINARY_INDEX_ENTRY.pack(flag.encode("ascii"), x, y))
+
+    body_offset = BINARY_HEADER.size + BINARY_INDEX_ENTRY.size * len(entries)
+    header = BINARY_HEADER.pack(
+        BINARY_MAGIC,
+        BINARY_VERSION,
+        the_world.width,
+        the_world.height,
+        the_world.start_xA,
+        the_world.start_yA,
+        the_world.start_xB,
+        the_world.start_yB,
+        (the_world.face_dirA + the_world.face_dirB).encode("ascii"),
+        len(entries),
+        body_offset
+    )
+    with open(filename, "wb") as f:
+        f.write(header)
+        f.write(b"".join(entries))
+        f.write(body)
+
+
+class BinaryWorld(CompactWorld):
+    """
+    CompactWorld loaded from the binary format. The cell body is memory
+    mapped read-only and used as the shared base, so cells are paged in on
+    demand and every fork of the world shares the same pages. Goals and
+    teleports come from the stored index, so loading does not touch the
+    body at all.
+    """
+
+    def __init__(self, world_filename):
+        super().__init__(world_filename)
+        self.mmap = None
+        self.body_offset = 0
+
+    def load_world(self):
+        try:
+            with open(self.world_filename, "rb") as f:
+                header = f.read(BINARY_HEADER.size)
+                if len(header) != BINARY_HEADER.size:
+                    raise misc.InvalidWorldException(
+                        f"World {self.world_filename} has a truncated header."
+                    )
+                (magic, version, width, height,
+                 xA, yA, xB, yB, facings, count, body_offset) = BINARY_HEADER.unpack(header)
+                if magic != BINARY_MAGIC or version != BINARY_VERSION:
+                    raise misc.InvalidWorldException(
+                        f"World {self.world_filename} is not a version {BINARY_VERSION} binary world."
+                    )
+
+                facings = facings.decode("ascii", "replace")
+                if facings[0] not in World.DIRECTIONS or facings[1] not in World.DIRECTIONS:
+                    raise misc.InvalidWorldException(
+                        f"World {self.world_filename} has an invalid starting facing."
+                    )
+
+                entries = f.read(BINARY_INDEX_ENTRY.size * count)
+                if len(entries) != BINARY_INDEX_ENTRY.size * count:
+                    raise misc.InvalidWorldException(
+                        f"World {self.world_filename} has a truncated index."
+                    )
+
+                self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            print(f"{self.world_filename} was not found.")
+            return
+
+        if len(self.mmap) < body_offset + width*height:
+            raise misc.InvalidWorldException(
+                f"World {self.world_filename} has a truncated cell body."
+            )
+
+        self.start_xA, self.start_yA, self.start_xB, self.start_yB = xA, yA, xB, yB
+        self.face_dirA, self.face_dirB = facings[0], facings[1]
+        self.width = width
+        self.height = height
+        self.body_offset = body_offset
+        self.cells = memoryview(self.mmap)[body_offset:body_offset + width*height]
+
+        self.positions = {}
+        for flag, x, y in BINARY_INDEX_ENTRY.iter_unpack(entries):
+            flag = flag.decode("ascii", "replace")
+            if flag not in World.INDEXED_CELLS:
+                raise misc.InvalidCellException(
+                    f"{flag} is not an indexed cell type."
+                )
+            self.positions.setdefault(flag, set()).add((x, y))
+
+        self.find_goals()
+        self.make_pristine()
+
+    def find_base_code(self, code, start=0):
+        if not isinstance(self.cells, memoryview):
+            return super().find_base_code(code, start)
+        index = self.mmap.find(bytes([code]), self.body_offset + start, self.body_offset + len(self.cells))
+        return index - self.body_offset if index >= 0 else -1